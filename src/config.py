@@ -1,4 +1,7 @@
+import os
+import tempfile
 from functools import lru_cache
+from typing import Literal
 from pydantic_settings import BaseSettings,SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -8,17 +11,96 @@ class Settings(BaseSettings):
     # -> Video Processing Configuration
 
     AUDIO_CHUNK_LENGTH: int = 120
+    AUDIO_CHUNK_PLANNER: bool = True
+    AUDIO_MIN_CHUNK_LENGTH: int = 30
+    AUDIO_MAX_CHUNK_LENGTH: int = 1200
     AUDIO_OVERLAP_LENGTH: int = 1
+    AUDIO_CHUNK_BOUNDARY: Literal["fixed","silence"] = "fixed"
+    AUDIO_BOUNDARY_TOLERANCE: float = 5.0
+    AUDIO_ENERGY_FRAME_MS: int = 20
+    AUDIO_CHUNKS_IN_MEMORY: bool = False
+    SHORTS_V1_STREAM_COPY: bool = True
+    SHORTS_V1_CUT_PADDING: float = 1.0
+    SHORTS_RENDER_WORKERS: int = 0
+    SHORTS_RENDER_WORKER_MEMORY_MB: int = 1536
+
+    # -> Download Configuration
+
+    DOWNLOAD_WORKERS: int = 8
+    DOWNLOAD_PART_SIZE: int = 16 * 1024 * 1024
+    DOWNLOAD_RETRIES: int = 3
+    DOWNLOAD_TIMEOUT: int = 60
+    STREAMING_INGEST: bool = True
+
+    # -> Transcription Audio Configuration
+
+    TRANSCRIBE_AUDIO_SAMPLE_RATE: int = 16000
+    TRANSCRIBE_AUDIO_CHANNELS: int = 1
+    TRANSCRIBE_AUDIO_FORMAT: Literal["wav","flac","opus"] = "flac"
+    TRANSCRIBE_AUDIO_BITRATE: str = "32k"
+    TRANSCRIBE_MAX_REQUEST_MB: float = 25.0
 
     # -> GEMINI Configuration
 
     GEMINI_API_KEY: str
     SHORTS_MODEL: str = "gemini-2.5-flash" 
+    SHORTS_ENHANCE_MODEL: str = "gemini-2.5-flash"
+    SHORTS_LLM_PROVIDER: Literal["gemini","fixture"] = "gemini"
+    PROMPT_TOKEN_REPORT: bool = False
+    SHORTS_STRUCTURED_OUTPUT: bool = True
+    SHORTS_LOCAL_SNAPPING: bool = True
+    SHORTS_SNAP_CONFIDENCE: float = 0.8
+    SHORTS_SNAP_WINDOW: float = 4.0
+    SHORTS_SNAP_MIN_PAUSE: float = 0.3
+    SHORTS_SNAP_MIN_KEEP: float = 0.6
+    SHORTS_ENHANCE_MODE: Literal["concurrent","batch"] = "concurrent"
+    SHORTS_ENHANCE_WORKERS: int = 4
+    SHORTS_SELECTION_MODE: Literal["single","map_reduce","auto"] = "auto"
+    SHORTS_MAP_REDUCE_MIN_DURATION: int = 2400
+    SHORTS_WINDOW_LENGTH: int = 600
+    SHORTS_WINDOW_OVERLAP: int = 120
+    SHORTS_WINDOW_WORKERS: int = 8
+    SHORTS_MAX_CLIPS: int = 10
+    SHORTS_PREFILTER: bool = True
+    SHORTS_PREFILTER_MIN_DURATION: int = 1200
+    SHORTS_PREFILTER_WINDOW: int = 60
+    SHORTS_PREFILTER_KEEP: float = 0.4
+    SHORTS_PREFILTER_CONTEXT: int = 1
 
     # -> GROQ CONFIGURATION
 
     GROQ_API_KEY: str
     AUDIO_TRANSCRIBE_MODEL: str = "whisper-large-v3-turbo"
+    TRANSCRIPTION_CACHE_BACKEND: Literal["none","disk","redis"] = "disk"
+    TRANSCRIPTION_CACHE_MAX_MB: int = 512
+    GROQ_BASE_URL: str | None = None
+    TRANSCRIPTION_BACKEND: Literal["groq","local","stub"] = "groq"
+    TRANSCRIPTION_FALLBACK_BACKEND: Literal["none","local","stub"] = "none"
+    TRANSCRIBE_INITIAL_CONCURRENCY: int = 4
+    TRANSCRIBE_MIN_CONCURRENCY: int = 1
+    TRANSCRIBE_MAX_CONCURRENCY: int = 16
+    TRANSCRIBE_TARGET_LATENCY: float = 20.0
+    TRANSCRIBE_TIMEOUT: float = 120.0
+    TRANSCRIBE_MAX_RETRIES: int = 5
+    TRANSCRIBE_BACKOFF_BASE: float = 1.0
+    TRANSCRIBE_BACKOFF_MAX: float = 60.0
+
+    # -> Local Whisper Configuration
+
+    LOCAL_WHISPER_MODEL: str = "small"
+    LOCAL_WHISPER_COMPUTE_TYPE: str = "int8"
+    LOCAL_WHISPER_WORKERS: int = 2
+    LOCAL_WHISPER_BEAM_SIZE: int = 5
+
+    # -> Cache Configuration
+
+    # Outside the working directory so workers never write into the source tree
+    CACHE_DIR: str = os.path.join(tempfile.gettempdir(),"shorts-generator-cache")
+    REDIS_URL: str = "redis://localhost:6379/0"
+    LLM_CACHE_BACKEND: Literal["none","disk","redis"] = "disk"
+    LLM_CACHE_MAX_MB: int = 64
+    LLM_CACHE_TTL: int = 7 * 24 * 3600
+    LLM_CACHE_BYPASS: bool = False
 
     # AWS S3 BUCKET Configuration
 
@@ -1,91 +1,63 @@
-import os
-
 from config import get_settings
 from loguru import logger
 
-from groq import Groq
-from io import BytesIO
+from shorts_generator.cache import get_cache,make_key
+from shorts_generator.transcription_backends import TranscriptionBackend,get_backend
 
 
 logger = logger.bind(name="AudioTranscriber")
 settings = get_settings()
 
 class AudioTranscriber:
+    """
+    Holds the transcription backends and cache of a job and shapes their results into transcripts.
+    The requests themselves are made by the TranscriptionEngine.
+    """
+
     def __init__(self):
-        self.client = Groq(api_key=settings.GROQ_API_KEY)
+        self.backend = get_backend(settings.TRANSCRIPTION_BACKEND)
+        self.fallback = None
+        if settings.TRANSCRIPTION_FALLBACK_BACKEND != "none":
+            self.fallback = get_backend(settings.TRANSCRIPTION_FALLBACK_BACKEND)
 
+        self.cache = get_cache("transcriptions",settings.TRANSCRIPTION_CACHE_BACKEND,settings.TRANSCRIPTION_CACHE_MAX_MB)
 
-        logger.info(f"AudioTranscriber Initilized\n Audio Transcriber Model: {settings.AUDIO_TRANSCRIBE_MODEL}")
 
+        logger.info(f"AudioTranscriber Initilized\n Transcription Backend: {self.backend.name} ({self.backend.model})\n Fallback Backend: {settings.TRANSCRIPTION_FALLBACK_BACKEND}\n Audio Format: {settings.TRANSCRIBE_AUDIO_FORMAT}\n Transcription Cache: {settings.TRANSCRIPTION_CACHE_BACKEND}")
 
-        
-    def transcribe_file(self,audio_path,id):
+
+    def request_key(self,backend:TranscriptionBackend,digest:bytes,params:dict) -> str:
         """
-        Transcribe the audio chunks and removed the transcribe audio chunk
+        Return the cache key of a transcription request
         """
 
+        return make_key(digest,backend.name,backend.model,params)
 
-        with open(audio_path, "rb") as file:
-            transcription = self.client.audio.transcriptions.create(
-            file=(audio_path, file.read()),
-            model=settings.AUDIO_TRANSCRIBE_MODEL,
-            response_format="verbose_json"
-            )
-
-            single_transcript = {}
-
-            single_transcript["id"] = id
-            single_transcript["text"] = transcription.text
-            single_transcript["text_with_timestamps"] = [ 
-            {
-                "id": item["id"],
-                "start": item["start"],
-                "end": item["end"],
-                "text": item["text"]
-            } 
-        
-            for item in transcription.segments]
-
-
-            logger.info(f"\nAudio {id} trasncribed successfully")
-
-            # os.remove(audio_path)
-
-            # logger.info(f"\nAudio {id} removed from path: {audio_path}")
-
-        return single_transcript
-    
-    def transcribe_short(self,audio_path,id):
+    @staticmethod
+    def chunk_transcript(id,transcription) -> dict:
         """
-        Transcribe the short audio chunks 
+        Return the chunk transcript with segment and word timestamps
         """
-        print("audio_path: ",audio_path)
-        with open(audio_path, "rb") as file:
-            transcription = self.client.audio.transcriptions.create(
-            file=(audio_path, file.read()),
-            model=settings.AUDIO_TRANSCRIBE_MODEL,
-            response_format="verbose_json",
-            timestamp_granularities=["word"]
-            )
 
-            single_transcript = {}
+        single_transcript = {}
 
-            single_transcript["id"] = id
-            single_transcript["text"] = transcription.text
-            single_transcript["word_with_timestamps"] = [ 
-            {
-                "start": item["start"],
-                "end": item["end"],
-                "word": item["word"]
-            } 
-        
-            for item in transcription.words]
+        single_transcript["id"] = id
+        single_transcript["text"] = transcription["text"]
+        single_transcript["text_with_timestamps"] = transcription["segments"]
+        single_transcript["word_with_timestamps"] = transcription["words"]
 
+        return single_transcript
 
-            logger.info(f"\nAudio {id} trasncribed successfully")
+    @staticmethod
+    def short_transcript(id,transcription) -> dict:
+        """
+        Return the short transcript with word timestamps
+        """
 
-            # os.remove(audio_path)
+        single_transcript = {}
 
-            # logger.info(f"\nAudio {id} removed from path: {audio_path}")
+        single_transcript["id"] = id
+        single_transcript["text"] = transcription["text"]
+        single_transcript["word_with_timestamps"] = transcription["words"]
 
-        return single_transcript
\ No newline at end of file
+        return single_transcript
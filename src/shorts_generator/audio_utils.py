@@ -0,0 +1,230 @@
+import hashlib
+import os
+import subprocess
+from contextlib import nullcontext
+from io import BytesIO
+
+import numpy as np
+from moviepy.config import FFMPEG_BINARY
+from scipy.io import wavfile
+
+from config import get_settings
+
+
+settings = get_settings()
+
+
+AUDIO_EXTENSIONS = {
+    "wav": ".wav",
+    "flac": ".flac",
+    "opus": ".ogg",
+}
+
+# Encoded sizes vary with the content beyond the probes, keep a margin under the limit
+REQUEST_SIZE_HEADROOM = 0.9
+
+PCM_FORMATS = {
+    "int16": "s16le",
+    "int32": "s32le",
+    "float32": "f32le",
+    "uint8": "u8",
+}
+
+
+def audio_extension(audio_format=None) -> str:
+    """
+    Return the file extension of the transcription audio format
+    """
+
+    return AUDIO_EXTENSIONS[audio_format or settings.TRANSCRIBE_AUDIO_FORMAT]
+
+
+def audio_profile_params() -> list:
+    """
+    Return the ffmpeg output params of the transcription audio profile
+    """
+
+    return ["-ac",str(settings.TRANSCRIBE_AUDIO_CHANNELS)]
+
+
+def encode_codec_params(audio_format) -> list:
+    """
+    Return the ffmpeg codec and muxer params of an encoded audio format.
+    Bitexact output keeps the encoding of the same samples byte identical (the ogg muxer
+    otherwise picks a random stream serial), so the transcription cache keys on it.
+    """
+
+    if audio_format == "flac":
+        return ["-c:a","flac","-fflags","+bitexact","-f","flac"]
+
+    if audio_format == "opus":
+        return ["-c:a","libopus","-b:a",settings.TRANSCRIBE_AUDIO_BITRATE,"-application","voip","-fflags","+bitexact","-f","ogg"]
+
+    raise ValueError(f"Unsupported audio format: {audio_format}")
+
+
+def encode_audio(data,rate:int,audio_format=None) -> bytes:
+    """
+    Encode pcm samples to the transcription audio format.
+    Wav is written directly, flac and opus are encoded by piping the samples through ffmpeg.
+    """
+
+    audio_format = audio_format or settings.TRANSCRIBE_AUDIO_FORMAT
+
+    if audio_format == "wav":
+        buffer = BytesIO()
+        wavfile.write(buffer,rate,data)
+        return buffer.getvalue()
+
+    channels = 1 if data.ndim == 1 else data.shape[1]
+
+    command = [
+        FFMPEG_BINARY,"-v","error",
+        "-f",PCM_FORMATS[data.dtype.name],"-ar",str(rate),"-ac",str(channels),"-i","pipe:0",
+        *audio_profile_params(),*encode_codec_params(audio_format),"pipe:1"
+    ]
+
+    result = subprocess.run(command,input=data.tobytes(),capture_output=True,check=True)
+
+    return result.stdout
+
+
+def encoded_bytes_per_second(data,rate:int,probes:int=3,probe_seconds:float=10.0) -> float:
+    """
+    Return the encoded bytes per second of the transcription audio format.
+    A few probe windows spread over the audio are encoded and the densest one is used,
+    since the flac and opus size depends on the content.
+    """
+
+    audio_length = len(data) / rate
+    window = min(probe_seconds,audio_length)
+
+    if window <= 0:
+        return 0.0
+
+    densities = []
+    for index in range(probes):
+        start = (audio_length - window) * (index + 1) / (probes + 1)
+        samples = data[int(rate * start):int(rate * (start + window))]
+        densities.append(len(encode_audio(samples,rate)) / window)
+
+    return max(densities)
+
+
+def plan_chunk_length(data,rate:int,concurrency:int) -> float:
+    """
+    Return the chunk length in seconds for the audio.
+    Chunks are as long as the max request size allows so long audio needs few requests,
+    but short enough that every request slot of the concurrency budget gets a chunk,
+    within AUDIO_MIN_CHUNK_LENGTH and AUDIO_MAX_CHUNK_LENGTH. The size limit always wins.
+    """
+
+    audio_length = len(data) / rate
+    bytes_per_second = encoded_bytes_per_second(data,rate)
+
+    # The overlap and a silence aligned boundary can make a chunk longer than planned
+    slack = settings.AUDIO_OVERLAP_LENGTH
+    if settings.AUDIO_CHUNK_BOUNDARY == "silence":
+        slack += settings.AUDIO_BOUNDARY_TOLERANCE
+
+    max_bytes = settings.TRANSCRIBE_MAX_REQUEST_MB * 1024 * 1024 * REQUEST_SIZE_HEADROOM
+    size_limit = max_bytes / bytes_per_second - slack if bytes_per_second else float("inf")
+
+    chunk_length = max(audio_length / max(1,concurrency),settings.AUDIO_MIN_CHUNK_LENGTH)
+    chunk_length = min(chunk_length,settings.AUDIO_MAX_CHUNK_LENGTH,size_limit)
+
+    # Chunks must be longer than their overlap to make progress
+    return round(max(chunk_length,settings.AUDIO_OVERLAP_LENGTH + 1.0),3)
+
+
+def energy_envelope(data,rate:int,frame_ms=None):
+    """
+    Return the short-time energy (mean square) of the samples per frame
+    """
+
+    frame_ms = frame_ms or settings.AUDIO_ENERGY_FRAME_MS
+    frame = max(1,int(rate * frame_ms / 1000))
+    frames = len(data) // frame
+
+    samples = np.asarray(data[:frames * frame],dtype=np.float32)
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1)
+
+    return np.square(samples.reshape(frames,frame)).mean(axis=1)
+
+
+def quietest_point(data,rate:int,center:float,tolerance:float) -> float:
+    """
+    Return the quietest time within tolerance seconds around center.
+    The envelope is smoothed over ~100 ms so a pause wins over a single quiet frame,
+    and ties are broken towards the center.
+    """
+
+    frame_ms = settings.AUDIO_ENERGY_FRAME_MS
+    frame = max(1,int(rate * frame_ms / 1000))
+    low = max(center - tolerance,0)
+    high = min(center + tolerance,len(data) / rate)
+
+    envelope = energy_envelope(data[int(rate * low):int(rate * high)],rate,frame_ms)
+
+    if len(envelope) == 0:
+        return center
+
+    width = max(1,100 // frame_ms)
+    envelope = np.convolve(envelope,np.ones(width) / width,mode="same")
+
+    times = low + (np.arange(len(envelope)) + 0.5) * frame / rate
+    distance = np.abs(times - center) / max(tolerance,1e-6)
+
+    # Distance only breaks near-ties, energy dominates the choice
+    score = envelope / (envelope.max() + 1e-9) + 1e-3 * distance
+
+    return float(times[np.argmin(score)])
+
+
+def audio_digest(audio) -> bytes:
+    """
+    Return the sha256 digest of an audio path or in-memory audio buffer,
+    files are hashed in blocks so they are never read into memory whole
+    """
+
+    if isinstance(audio,str):
+        with open(audio,"rb") as file:
+            return hashlib.file_digest(file,"sha256").digest()
+
+    with audio.getbuffer() as view:
+        return hashlib.sha256(view).digest()
+
+
+def audio_name(audio) -> str:
+    """
+    Return the file name of an audio path or in-memory audio buffer
+    """
+
+    return os.path.basename(audio) if isinstance(audio,str) else audio.name
+
+
+def open_audio(audio):
+    """
+    Return a file object of an audio path or in-memory audio buffer rewound to the start
+    """
+
+    if isinstance(audio,str):
+        return open(audio,"rb")
+
+    audio.seek(0)
+    return nullcontext(audio)
+
+
+def audio_duration(audio) -> float:
+    """
+    Return the duration in seconds of an encoded audio path or in-memory audio buffer
+    """
+
+    source = audio if isinstance(audio,str) else "pipe:0"
+    data = None if isinstance(audio,str) else audio.getvalue()
+
+    command = [FFMPEG_BINARY,"-v","error","-i",source,"-f","s16le","-ac","1","-ar","16000","pipe:1"]
+    result = subprocess.run(command,input=data,capture_output=True,check=True)
+
+    return len(result.stdout) / (2 * 16000)
@@ -0,0 +1,199 @@
+import re
+
+from loguru import logger
+from scipy.io import wavfile
+
+from config import get_settings
+from shorts_generator.audio_utils import quietest_point
+from shorts_generator.transcript import SENTENCE_END,TranscriptTimeline
+
+
+logger = logger.bind(name="BoundarySnapper")
+settings = get_settings()
+
+# Words that make a weak first or last word of a short
+EDGE_FILLERS = {"so","yeah","um","uh","like","okay","ok","well","right","and","but","anyway","basically","actually"}
+EDGE_FILLER_PHRASES = [("you","know"),("i","mean"),("kind","of"),("sort","of")]
+
+# How good a boundary is, by what it was snapped to
+BOUNDARY_QUALITY = {"sentence": 1.0,"pause": 0.6,"word": 0.2}
+
+# The first pass pads each side of a short with 2-3 seconds
+FIRST_PASS_PADDING = 2.5
+# Longest silence kept before the first or after the last word
+MAX_EDGE_SILENCE = 0.4
+
+
+def plain(word:str) -> str:
+    return re.sub(r"[^\w']","",word).lower()
+
+
+class BoundarySnapper:
+    """
+    Trims a cut short to clean word boundaries without a model call.
+    The start snaps to the first word of a sentence and the end to a sentence ending word,
+    sentence ends are taken from the punctuated segments of the timeline,
+    or to a pause between words, near the first pass boundaries.
+    Edge fillers are stripped and the cut points are moved to the quietest
+    moment between the edge words and their neighbours.
+    """
+
+    def __init__(self,audio_path:str=None,timeline:TranscriptTimeline=None):
+        self.rate = None
+        self.data = None
+        self.timeline = timeline
+
+        if audio_path is not None:
+            self.rate,self.data = wavfile.read(audio_path,mmap=True)
+
+    def sentence_ends(self,item:dict) -> set:
+        """
+        Return the end times, relative to the cut short, of the words finishing a sentence
+        """
+
+        if self.timeline is None:
+            return set()
+
+        offset = item["source_start"]
+
+        return {round(end - offset,3) for end in self.timeline.sentence_ends(offset,item["source_end"])}
+
+    def is_sentence_start(self,words:list,index:int,ends:set) -> bool:
+        # The cut can start mid sentence, so the first word is not known to start one
+        return index > 0 and self.is_sentence_end(words,index - 1,ends)
+
+    def is_sentence_end(self,words:list,index:int,ends:set) -> bool:
+        # Words of a transcription with punctuated tokens end sentences themselves
+        return round(words[index]["end"],3) in ends or bool(SENTENCE_END.search(words[index]["word"].strip()))
+
+    def pause_before(self,words:list,index:int) -> float:
+        return words[index]["start"] - words[index - 1]["end"] if index > 0 else float("inf")
+
+    def pause_after(self,words:list,index:int) -> float:
+        return words[index + 1]["start"] - words[index]["end"] if index < len(words) - 1 else float("inf")
+
+    def snap_start(self,words:list,target:float,ends:set) -> tuple:
+        """
+        Return the index of the first word and what it was snapped to
+        """
+
+        window = [index for index,word in enumerate(words) if abs(word["start"] - target) <= settings.SHORTS_SNAP_WINDOW]
+
+        for kind,check in (
+            ("sentence",lambda index: self.is_sentence_start(words,index,ends)),
+            ("pause",lambda index: self.pause_before(words,index) >= settings.SHORTS_SNAP_MIN_PAUSE),
+        ):
+            candidates = [index for index in window if check(index)]
+            if candidates:
+                return min(candidates,key=lambda index: abs(words[index]["start"] - target)),kind
+
+        after = [index for index,word in enumerate(words) if word["start"] >= target]
+
+        return (after[0] if after else 0),"word"
+
+    def snap_end(self,words:list,target:float,ends:set) -> tuple:
+        """
+        Return the index of the last word and what it was snapped to
+        """
+
+        window = [index for index,word in enumerate(words) if abs(word["end"] - target) <= settings.SHORTS_SNAP_WINDOW]
+
+        for kind,check in (
+            ("sentence",lambda index: self.is_sentence_end(words,index,ends)),
+            ("pause",lambda index: self.pause_after(words,index) >= settings.SHORTS_SNAP_MIN_PAUSE),
+        ):
+            candidates = [index for index in window if check(index)]
+            if candidates:
+                return min(candidates,key=lambda index: abs(words[index]["end"] - target)),kind
+
+        before = [index for index,word in enumerate(words) if word["end"] <= target]
+
+        return (before[-1] if before else len(words) - 1),"word"
+
+    def strip_fillers(self,words:list,first:int,last:int) -> tuple:
+        """
+        Move the first and last word past the fillers at the edges
+        """
+
+        while first < last:
+            if plain(words[first]["word"]) in EDGE_FILLERS:
+                first += 1
+            elif any(first + 1 < last and (plain(words[first]["word"]),plain(words[first + 1]["word"])) == phrase for phrase in EDGE_FILLER_PHRASES):
+                first += 2
+            else:
+                break
+
+        while last > first:
+            if plain(words[last]["word"]) in EDGE_FILLERS:
+                last -= 1
+            elif any(last - 1 > first and (plain(words[last - 1]["word"]),plain(words[last]["word"])) == phrase for phrase in EDGE_FILLER_PHRASES):
+                last -= 2
+            else:
+                break
+
+        return first,last
+
+    def quiet_cut(self,low:float,high:float,offset:float,fallback:float) -> float:
+        """
+        Return the quietest time between low and high (relative to the short),
+        offset is the absolute start of the short in the master audio
+        """
+
+        if self.data is None or high - low < 2 * settings.AUDIO_ENERGY_FRAME_MS / 1000:
+            return fallback
+
+        center = (low + high) / 2
+        cut = quietest_point(self.data,self.rate,offset + center,(high - low) / 2) - offset
+
+        return min(max(cut,low),high)
+
+    def snap(self,item:dict,short_transcription:dict) -> tuple:
+        """
+        Return the trimmed timestamps of the short relative to its v1 cut,
+        with the first pass metadata carried over, and the confidence of the trim from 0 to 1
+        """
+
+        words = short_transcription.get("word_with_timestamps") or []
+        offset = item["source_start"]
+
+        if "error" in short_transcription or len(words) < 2:
+            return None,0.0
+
+        target_start = item["start"] - offset + FIRST_PASS_PADDING
+        target_end = item["end"] - offset - FIRST_PASS_PADDING
+
+        if target_end - target_start < 1:
+            target_start,target_end = item["start"] - offset,item["end"] - offset
+
+        ends = self.sentence_ends(item)
+        first,start_kind = self.snap_start(words,target_start,ends)
+        last,end_kind = self.snap_end(words,target_end,ends)
+        first,last = self.strip_fillers(words,first,last)
+
+        if last <= first:
+            return None,0.0
+
+        previous_end = words[first - 1]["end"] if first > 0 else max(words[first]["start"] - MAX_EDGE_SILENCE,0)
+        next_start = words[last + 1]["start"] if last < len(words) - 1 else words[last]["end"] + MAX_EDGE_SILENCE
+
+        start = self.quiet_cut(
+            max(previous_end,words[first]["start"] - MAX_EDGE_SILENCE),words[first]["start"],offset,
+            max(words[first]["start"] - 0.1,0)
+        )
+        end = self.quiet_cut(
+            words[last]["end"],min(next_start,words[last]["end"] + MAX_EDGE_SILENCE),offset,
+            words[last]["end"] + 0.1
+        )
+
+        timestamp = {key: value for key,value in item.items() if key not in ("source_start","source_end")}
+        timestamp["start"] = round(max(start,0),3)
+        timestamp["end"] = round(end,3)
+
+        confidence = (BOUNDARY_QUALITY[start_kind] + BOUNDARY_QUALITY[end_kind]) / 2
+
+        # Trimming away much of the selected content means the boundaries were not found
+        kept = (timestamp["end"] - timestamp["start"]) / max(target_end - target_start,1e-6)
+        if kept < settings.SHORTS_SNAP_MIN_KEEP:
+            confidence *= kept
+
+        return timestamp,round(confidence,3)
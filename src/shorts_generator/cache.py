@@ -0,0 +1,237 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from loguru import logger
+
+from config import get_settings
+
+
+logger = logger.bind(name="Cache")
+settings = get_settings()
+
+
+def make_key(*parts) -> str:
+    """
+    Return a sha256 content hash of the given bytes and json-serializable parts
+    """
+
+    digest = hashlib.sha256()
+
+    for part in parts:
+        if not isinstance(part,bytes):
+            part = json.dumps(part,sort_keys=True,default=str).encode()
+        digest.update(hashlib.sha256(part).digest())
+
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    Json files on local disk, evicted least recently used first once max_bytes is exceeded.
+    Entries older than ttl seconds are expired on read.
+    """
+
+    def __init__(self,directory:str,max_bytes:int,ttl:int=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+        os.makedirs(directory,exist_ok=True)
+
+        self.size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith(".json"))
+
+    def path(self,key:str) -> str:
+        return os.path.join(self.directory,f"{key}.json")
+
+    def get(self,key:str):
+        path = self.path(key)
+
+        try:
+            with open(path) as file:
+                entry = json.load(file)
+        except (FileNotFoundError,json.JSONDecodeError):
+            return None
+
+        if not isinstance(entry,dict) or "value" not in entry:
+            return None
+
+        if self.ttl and time.time() - entry.get("created",0) > self.ttl:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+
+        # The modification time is the recency used for eviction
+        os.utime(path)
+
+        return entry["value"]
+
+    def set(self,key:str,value):
+        path = self.path(key)
+        data = json.dumps({"created": time.time(),"value": value})
+
+        # A temporary file of its own per writer, concurrent sets of the same key must not share one
+        fd,temp_path = tempfile.mkstemp(dir=self.directory,suffix=".tmp")
+        try:
+            with os.fdopen(fd,"w") as file:
+                file.write(data)
+            os.replace(temp_path,path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+        with self.lock:
+            self.size += len(data)
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+
+        self.size = sum(entry.stat().st_size for entry in entries)
+
+        for entry in entries:
+            if self.size <= self.max_bytes:
+                break
+            size = entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            self.size -= size
+
+
+class RedisCache:
+    """
+    Redis strings with a sorted set of access times, evicted least recently used first once max_bytes is exceeded.
+    Entries expire after ttl seconds.
+    """
+
+    def __init__(self,url:str,namespace:str,max_bytes:int,ttl:int=None):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.recency = f"{namespace}:recency"
+        self.sizes = f"{namespace}:sizes"
+        self.total = f"{namespace}:bytes"
+
+    def get(self,key:str):
+        value = self.client.get(f"{self.namespace}:{key}")
+
+        if value is None:
+            if self.ttl:
+                self.forget(key)
+            return None
+
+        self.client.zadd(self.recency,{key: time.time()})
+
+        return json.loads(value)
+
+    def forget(self,key:str):
+        """
+        Drop the recency and size of an expired entry
+        """
+
+        size = self.client.hget(self.sizes,key)
+        if size is None:
+            return
+
+        pipeline = self.client.pipeline()
+        pipeline.zrem(self.recency,key)
+        pipeline.hdel(self.sizes,key)
+        pipeline.incrby(self.total,-int(size))
+        pipeline.execute()
+
+    def set(self,key:str,value):
+        data = json.dumps(value)
+
+        previous = self.client.hget(self.sizes,key)
+
+        pipeline = self.client.pipeline()
+        pipeline.set(f"{self.namespace}:{key}",data,ex=self.ttl or None)
+        pipeline.zadd(self.recency,{key: time.time()})
+        pipeline.hset(self.sizes,key,len(data))
+        pipeline.incrby(self.total,len(data) - int(previous or 0))
+        total = pipeline.execute()[-1]
+
+        while total > self.max_bytes:
+            oldest = self.client.zpopmin(self.recency)
+            if not oldest:
+                break
+            old_key = oldest[0][0].decode()
+            size = int(self.client.hget(self.sizes,old_key) or 0)
+
+            pipeline = self.client.pipeline()
+            pipeline.delete(f"{self.namespace}:{old_key}")
+            pipeline.hdel(self.sizes,old_key)
+            pipeline.incrby(self.total,-size)
+            total = pipeline.execute()[-1]
+
+
+class Cache:
+    """
+    Cache front end counting hits and misses, cache errors never fail the caller
+    """
+
+    def __init__(self,backend,name:str):
+        self.backend = backend
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self,key:str):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"{self.name} cache read failed: {e}")
+            value = None
+
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return value
+
+    def set(self,key:str,value):
+        try:
+            self.backend.set(key,value)
+        except Exception as e:
+            logger.warning(f"{self.name} cache write failed: {e}")
+
+    def stats(self) -> dict:
+        return {"hits": self.hits,"misses": self.misses}
+
+
+def get_cache(name:str,backend:str,max_mb:int,ttl:int=None):
+    """
+    Return a cache for the namespace on the configured backend, or None if caching is disabled.
+    Entries expire after ttl seconds if given.
+    """
+
+    if backend == "none":
+        return None
+
+    max_bytes = max_mb * 1024 * 1024
+
+    if backend == "redis":
+        return Cache(RedisCache(settings.REDIS_URL,f"shorts-cache:{name}",max_bytes,ttl),name)
+
+    return Cache(DiskCache(os.path.join(settings.CACHE_DIR,name),max_bytes,ttl),name)
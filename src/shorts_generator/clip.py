@@ -0,0 +1,106 @@
+import json
+from typing import Literal
+
+from loguru import logger
+from pydantic import BaseModel,Field,ValidationError,model_validator
+
+
+logger = logger.bind(name="Clip")
+
+
+class ShortClip(BaseModel):
+    title: str
+    start: float
+    end: float
+    summary: str
+    hook: str
+    main_topic: str
+    content_type: str
+    clip_label: Literal["Hook","Insight","Educational","Story","Controversial","Question"]
+    hook_strength: Literal["High","Medium","Low"]
+    confidence_score: int = Field(ge=0,le=100)
+
+    @model_validator(mode="after")
+    def check_times(self):
+        if self.start < 0 or self.end <= self.start:
+            raise ValueError(f"Invalid clip times {self.start} - {self.end}")
+        return self
+
+
+class EnhancedClip(ShortClip):
+    # The id of the short a batch enhancement belongs to
+    id: int
+
+
+class JsonArrayStream:
+    """
+    Incremental parser of a streamed json array of objects.
+    Text is fed as it arrives and every object is returned as soon as its closing
+    brace is read, without waiting for the rest of the array.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.object_start = None
+
+    def feed(self,text:str) -> list:
+        """
+        Return the objects completed by the text, a malformed object is skipped
+        """
+
+        self.buffer += text
+        objects = []
+
+        while self.position < len(self.buffer):
+            char = self.buffer[self.position]
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "[{":
+                self.depth += 1
+                # Objects directly inside the top level array
+                if char == "{" and self.depth == 2:
+                    self.object_start = self.position
+            elif char in "]}":
+                self.depth -= 1
+                if char == "}" and self.depth == 1 and self.object_start is not None:
+                    raw = self.buffer[self.object_start:self.position + 1]
+                    self.object_start = None
+                    try:
+                        objects.append(json.loads(raw))
+                    except json.JSONDecodeError as e:
+                        logger.warning(f"Skipping malformed clip json: {e}")
+
+            self.position += 1
+
+        # Completed text before the current object is not needed anymore
+        keep = self.object_start if self.object_start is not None else self.position
+        self.buffer = self.buffer[keep:]
+        self.position -= keep
+        if self.object_start is not None:
+            self.object_start = 0
+
+        return objects
+
+
+def validate_clip(data,model=ShortClip):
+    """
+    Return the clip validated against the model as a dict, or None if it is malformed
+    """
+
+    try:
+        return model.model_validate(data).model_dump()
+    except ValidationError as e:
+        logger.warning(f"Skipping invalid clip: {e.errors()[0]['msg']}")
+        return None
@@ -0,0 +1,320 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from loguru import logger
+
+from config import get_settings
+from shorts_generator.utils import get_s3_client
+
+
+logger = logger.bind(name="VideoDownloader")
+settings = get_settings()
+
+READ_SIZE = 1024 * 1024
+
+
+class DownloadError(Exception):
+    pass
+
+
+class RangeIgnoredError(DownloadError):
+    pass
+
+
+class VideoDownloader:
+    def __init__(self,video_url:str,output_video_path:str):
+        self.video_url = video_url
+        self.output_video_path = output_video_path
+        self.part_path = f"{output_video_path}.part"
+        self.state_path = f"{output_video_path}.part.json"
+        self.s3_key = self.bucket_key(video_url)
+        self.lock = threading.Lock()
+        self.part_done = threading.Condition(self.lock)
+        self.failed = False
+        # Bytes already passed to the sink by the ranged download
+        self.fed = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1,pool_maxsize=settings.DOWNLOAD_WORKERS)
+        self.session.mount("http://",adapter)
+        self.session.mount("https://",adapter)
+
+    @staticmethod
+    def bucket_key(video_url:str):
+        """
+        Return the object key if the url points at our own bucket, else None
+        """
+
+        parsed = urlparse(video_url)
+        host = parsed.hostname or ""
+
+        if host.startswith(f"{settings.BUCKET_NAME}.s3.") and host.endswith(".amazonaws.com"):
+            return unquote(parsed.path.lstrip("/"))
+
+        return None
+
+    def head(self) -> dict:
+        """
+        Return the size, etag, server side encryption and range support of the remote file
+        """
+
+        if self.s3_key is not None:
+            response = get_s3_client().head_object(Bucket=settings.BUCKET_NAME,Key=self.s3_key)
+            return {
+                "size": response["ContentLength"],
+                "etag": response.get("ETag"),
+                "encryption": "SSE-C" if response.get("SSECustomerAlgorithm") else response.get("ServerSideEncryption"),
+                "ranges": True,
+            }
+
+        response = self.session.head(self.video_url,allow_redirects=True,timeout=settings.DOWNLOAD_TIMEOUT)
+
+        if not response.ok:
+            logger.warning(f"HEAD request failed with status {response.status_code}, downloading over a single connection")
+            return {"size": None,"etag": None,"encryption": None,"ranges": False}
+
+        size = response.headers.get("Content-Length")
+        customer_key = response.headers.get("x-amz-server-side-encryption-customer-algorithm")
+
+        return {
+            "size": int(size) if size is not None else None,
+            "etag": response.headers.get("ETag"),
+            "encryption": "SSE-C" if customer_key else response.headers.get("x-amz-server-side-encryption"),
+            "ranges": response.headers.get("Accept-Ranges","").lower() == "bytes" and size is not None,
+        }
+
+    def open_range(self,start:int,end:int,etag=None):
+        """
+        Return an iterator over the bytes [start, end] of the remote file
+        """
+
+        if self.s3_key is not None:
+            params = {"Bucket": settings.BUCKET_NAME,"Key": self.s3_key,"Range": f"bytes={start}-{end}"}
+            if etag:
+                params["IfMatch"] = etag
+            return get_s3_client().get_object(**params)["Body"].iter_chunks(READ_SIZE)
+
+        headers = {"Range": f"bytes={start}-{end}"}
+        if etag and not etag.startswith("W/"):
+            headers["If-Match"] = etag
+
+        response = self.session.get(self.video_url,headers=headers,stream=True,timeout=settings.DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+
+        if response.status_code != 206:
+            response.close()
+            raise RangeIgnoredError(f"Server ignored range request for bytes {start}-{end}")
+
+        return response.iter_content(READ_SIZE)
+
+    def load_state(self,remote:dict) -> set:
+        """
+        Return the parts already downloaded by a previous attempt of the same file
+        """
+
+        if not (os.path.exists(self.state_path) and os.path.exists(self.part_path)):
+            return set()
+
+        with open(self.state_path) as file:
+            state = json.load(file)
+
+        if state.get("size") != remote["size"] or state.get("etag") != remote["etag"] or state.get("part_size") != settings.DOWNLOAD_PART_SIZE:
+            logger.info("Remote file changed since the last attempt, restarting download")
+            return set()
+
+        return set(state["done"])
+
+    def save_state(self,remote:dict,done:set):
+        state = {"size": remote["size"],"etag": remote["etag"],"part_size": settings.DOWNLOAD_PART_SIZE,"done": sorted(done)}
+
+        with open(f"{self.state_path}.tmp","w") as file:
+            json.dump(state,file)
+
+        os.replace(f"{self.state_path}.tmp",self.state_path)
+
+    def download_part(self,fd:int,index:int,remote:dict,done:set):
+        """
+        Download a single part with jittered exponential backoff between attempts
+        """
+
+        start = index * settings.DOWNLOAD_PART_SIZE
+        end = min(start + settings.DOWNLOAD_PART_SIZE,remote["size"]) - 1
+
+        for attempt in range(settings.DOWNLOAD_RETRIES + 1):
+            try:
+                offset = start
+                for chunk in self.open_range(start,end,remote["etag"]):
+                    os.pwrite(fd,chunk,offset)
+                    offset += len(chunk)
+
+                if offset != end + 1:
+                    raise DownloadError(f"Part {index} is incomplete: got {offset - start} of {end - start + 1} bytes")
+
+                break
+            except RangeIgnoredError:
+                raise
+            except Exception as e:
+                if attempt == settings.DOWNLOAD_RETRIES:
+                    raise
+                delay = 2 ** attempt + random.random()
+                logger.warning(f"Part {index} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+        with self.lock:
+            done.add(index)
+            self.save_state(remote,done)
+            self.part_done.notify_all()
+
+    def feed(self,sink,parts:int,done:set):
+        """
+        Pass the downloaded bytes to sink in file order as soon as each part is complete
+        """
+
+        fd = os.open(self.part_path,os.O_RDONLY)
+        try:
+            for index in range(parts):
+                with self.part_done:
+                    while index not in done and not self.failed:
+                        self.part_done.wait()
+                    if self.failed:
+                        return
+
+                start = index * settings.DOWNLOAD_PART_SIZE
+                end = start + settings.DOWNLOAD_PART_SIZE
+                while start < end:
+                    chunk = os.pread(fd,min(READ_SIZE,end - start),start)
+                    if not chunk:
+                        break
+                    sink(chunk)
+                    self.fed += len(chunk)
+                    start += len(chunk)
+        finally:
+            os.close(fd)
+
+    def download_ranged(self,remote:dict,sink=None):
+        """
+        Download the file with concurrent range requests, resuming finished parts
+        """
+
+        parts = -(-remote["size"] // settings.DOWNLOAD_PART_SIZE)
+        done = self.load_state(remote)
+
+        if not done:
+            with open(self.part_path,"wb") as file:
+                file.truncate(remote["size"])
+            self.save_state(remote,done)
+        else:
+            logger.info(f"Resuming download, {len(done)} of {parts} parts already downloaded")
+
+        pending = [index for index in range(parts) if index not in done]
+
+        feeder = None
+        if sink is not None:
+            feeder = threading.Thread(target=self.feed,args=(sink,parts,done),daemon=True)
+            feeder.start()
+
+        fd = os.open(self.part_path,os.O_RDWR)
+        try:
+            with ThreadPoolExecutor(max_workers=settings.DOWNLOAD_WORKERS) as executor:
+                # Consume the results so the first failing part raises here
+                list(executor.map(lambda index: self.download_part(fd,index,remote,done),pending))
+        except Exception:
+            with self.part_done:
+                self.failed = True
+                self.part_done.notify_all()
+            raise
+        finally:
+            os.close(fd)
+            if feeder is not None:
+                feeder.join()
+
+    def download_single(self,remote:dict,sink=None,fed:int=0):
+        """
+        Download the file over a single connection when ranges are not supported,
+        the first fed bytes were already passed to sink by an interrupted ranged download
+        """
+
+        if self.s3_key is not None:
+            body = get_s3_client().get_object(Bucket=settings.BUCKET_NAME,Key=self.s3_key)["Body"].iter_chunks(READ_SIZE)
+        else:
+            response = self.session.get(self.video_url,stream=True,timeout=settings.DOWNLOAD_TIMEOUT)
+            response.raise_for_status()
+            body = response.iter_content(READ_SIZE)
+
+        position = 0
+
+        with open(self.part_path,"wb") as file:
+            for chunk in body:
+                file.write(chunk)
+                if sink is not None and position + len(chunk) > fed:
+                    sink(chunk[max(fed - position,0):])
+                position += len(chunk)
+
+    def verify(self,remote:dict):
+        """
+        Check the downloaded size and, for S3 single part uploads, the md5 etag.
+        The etag of an object encrypted with SSE-KMS or SSE-C is not the md5 of its data,
+        those downloads rely on the size and the If-Match of the range requests.
+        """
+
+        size = os.path.getsize(self.part_path)
+
+        if remote["size"] is not None and size != remote["size"]:
+            raise DownloadError(f"Downloaded size {size} does not match remote size {remote['size']}")
+
+        etag = (remote["etag"] or "").strip('"')
+        from_s3 = self.s3_key is not None or (urlparse(self.video_url).hostname or "").endswith(".amazonaws.com")
+
+        # Multipart uploads have "<md5>-<parts>" etags which are not the file md5
+        if from_s3 and remote.get("encryption") in (None,"AES256") and re.fullmatch(r"[0-9a-f]{32}",etag):
+            md5 = hashlib.md5()
+            with open(self.part_path,"rb") as file:
+                for chunk in iter(lambda: file.read(READ_SIZE),b""):
+                    md5.update(chunk)
+
+            if md5.hexdigest() != etag:
+                raise DownloadError(f"Downloaded md5 {md5.hexdigest()} does not match etag {etag}")
+
+    def download(self,sink=None) -> str:
+        """
+        Download the video to output_video_path and return the path.
+        If sink is given it is called with the file bytes in order while they arrive.
+        """
+
+        remote = self.head()
+
+        source = f"s3://{settings.BUCKET_NAME}/{self.s3_key}" if self.s3_key is not None else self.video_url
+        logger.info(f"Downloading {source} ({remote['size']} bytes, ranges: {remote['ranges']})")
+
+        if remote["ranges"] and remote["size"]:
+            try:
+                self.download_ranged(remote,sink)
+            except RangeIgnoredError as e:
+                logger.warning(f"{e}, downloading over a single connection")
+                self.download_single(remote,sink,self.fed)
+        else:
+            self.download_single(remote,sink)
+
+        try:
+            self.verify(remote)
+        except DownloadError:
+            # A corrupt file must not be resumed by the next attempt
+            os.remove(self.part_path)
+            if os.path.exists(self.state_path):
+                os.remove(self.state_path)
+            raise
+
+        os.replace(self.part_path,self.output_video_path)
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+        return self.output_video_path
@@ -0,0 +1,206 @@
+import ast
+import json
+import re
+import zlib
+from abc import ABC,abstractmethod
+from functools import lru_cache
+
+from loguru import logger
+
+from config import get_settings
+from shorts_generator.prompt import SHORTS_TOPIC_PROMPT,SHORT_ENHANCEMENT_PROPMT,SHORTS_BATCH_ENHANCEMENT_PROMPT
+
+
+logger = logger.bind(name="LLMProvider")
+settings = get_settings()
+
+SEGMENT_LINE = re.compile(r"^\[(\d+(?:\.\d+)?)-(\d+(?:\.\d+)?)\] (.*)$",re.M)
+
+FIXTURE_LABELS = ["Insight","Educational","Story","Hook","Question","Controversial"]
+FIXTURE_MAX_CLIPS = 10
+
+
+class LLMProvider(ABC):
+    """
+    A text generation service. generate returns the response text of a prompt,
+    the model is chosen per call and config holds provider request options
+    such as response_mime_type and response_schema.
+    """
+
+    name = ""
+
+    @abstractmethod
+    def generate(self,model:str,prompt:str,config:dict=None) -> str:
+        pass
+
+    def generate_stream(self,model:str,prompt:str,config:dict=None):
+        """
+        Yield the response text in pieces as it is generated
+        """
+
+        yield self.generate(model,prompt,config)
+
+    def count_tokens(self,model:str,text:str) -> int:
+        return len(text) // 4
+
+
+class GeminiProvider(LLMProvider):
+    """
+    Gemini through the google-genai client
+    """
+
+    name = "gemini"
+
+    def __init__(self):
+        from google import genai
+
+        self.client = genai.Client(api_key=settings.GEMINI_API_KEY)
+
+    def generate(self,model:str,prompt:str,config:dict=None) -> str:
+        return self.client.models.generate_content(model=model,contents=prompt,config=config).text
+
+    def generate_stream(self,model:str,prompt:str,config:dict=None):
+        for chunk in self.client.models.generate_content_stream(model=model,contents=prompt,config=config):
+            if chunk.text:
+                yield chunk.text
+
+    def count_tokens(self,model:str,text:str) -> int:
+        return self.client.models.count_tokens(model=model,contents=text).total_tokens
+
+
+def fixture_score(text:str) -> int:
+    """
+    Return a stable confidence score from 55 to 85 for the text
+    """
+
+    return 55 + zlib.crc32(text.encode()) % 31
+
+
+def fixture_clip(text:str,start:float,end:float,index:int) -> dict:
+    words = text.split()
+
+    return {
+        "title": " ".join(words[:6]).strip(".,?!").capitalize() or f"Clip {index + 1}",
+        "start": start,
+        "end": end,
+        "summary": text[:200],
+        "hook": " ".join(words[:12]),
+        "main_topic": " ".join(words[:3]).lower(),
+        "content_type": "explanation",
+        "clip_label": FIXTURE_LABELS[index % len(FIXTURE_LABELS)],
+        "hook_strength": ["High","Medium","Low"][index % 3],
+        "confidence_score": fixture_score(text),
+    }
+
+
+def template_inputs(template:str,prompt:str):
+    """
+    Return the inputs the template was filled with to give the prompt, or None if it was not.
+    The text between the placeholders is matched from the end, so an input
+    may contain anything but the template text that follows it.
+    """
+
+    pieces = [piece.replace("{{","{").replace("}}","}") for piece in template.split("{}")]
+
+    if len(prompt) < len(pieces[0]) + len(pieces[-1]) or not (prompt.startswith(pieces[0]) and prompt.endswith(pieces[-1])):
+        return None
+
+    body = prompt[len(pieces[0]):len(prompt) - len(pieces[-1])]
+    inputs = []
+
+    for piece in reversed(pieces[1:-1]):
+        body,found,value = body.rpartition(piece)
+        if not found:
+            return None
+        inputs.insert(0,value)
+
+    return [body] + inputs
+
+
+class FixtureProvider(LLMProvider):
+    """
+    Offline deterministic stand-in that answers from the transcript in the prompt.
+    Topic prompts get clips of consecutive segments up to the target duration,
+    enhancement prompts get the short trimmed to its first and last word.
+    The same prompt always gives the same answer, so the pipeline can be benchmarked without a network.
+    """
+
+    name = "fixture"
+
+    def generate(self,model:str,prompt:str,config:dict=None) -> str:
+        inputs = template_inputs(SHORTS_BATCH_ENHANCEMENT_PROMPT,prompt)
+        if inputs is not None:
+            return json.dumps(self.enhance_batch(json.loads(inputs[0])))
+
+        inputs = template_inputs(SHORT_ENHANCEMENT_PROPMT,prompt)
+        if inputs is not None:
+            return json.dumps(self.enhance(ast.literal_eval(inputs[0])))
+
+        inputs = template_inputs(SHORTS_TOPIC_PROMPT,prompt)
+        if inputs is not None:
+            return json.dumps(self.select(inputs[0],int(inputs[1])))
+
+        raise ValueError("The fixture provider only answers the shorts prompts")
+
+    def select(self,transcript:str,shorts_time:int) -> list:
+        """
+        Group the transcript segments into clips of at most the target duration
+        and keep every other group
+        """
+
+        segments = [(float(start),float(end),text) for start,end,text in SEGMENT_LINE.findall(transcript)]
+
+        groups = []
+        current = []
+
+        for segment in segments:
+            if current and segment[1] - current[0][0] > shorts_time:
+                groups.append(current)
+                current = []
+            current.append(segment)
+
+        if current:
+            groups.append(current)
+
+        clips = []
+        for index,group in enumerate(groups[::2][:FIXTURE_MAX_CLIPS]):
+            text = " ".join(segment[2] for segment in group)
+            clips.append(fixture_clip(text,group[0][0],group[-1][1],index))
+
+        return clips
+
+    def enhance(self,short:dict) -> dict:
+        words = short.get("word_with_timestamps") or []
+        text = " ".join(word["word"] for word in words)
+
+        if not words:
+            return fixture_clip(text,0.0,1.0,0)
+
+        return fixture_clip(text,words[0]["start"],words[-1]["end"],len(words))
+
+    def enhance_batch(self,shorts:list) -> list:
+        clips = []
+        for short in shorts:
+            clip = self.enhance(short)
+            clip["id"] = short["id"]
+            clips.append(clip)
+
+        return clips
+
+
+PROVIDERS = {
+    "gemini": GeminiProvider,
+    "fixture": FixtureProvider,
+}
+
+
+@lru_cache
+def get_provider(name:str) -> LLMProvider:
+    """
+    Return the llm provider of the name, created once per process
+    """
+
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown llm provider: {name}")
+
+    return PROVIDERS[name]()
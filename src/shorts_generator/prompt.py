@@ -1,8 +1,9 @@
 SHORTS_TOPIC_PROMPT="""
 You are a content editor creating viral-ready short-form videos for platforms like TikTok, YouTube Shorts, and Instagram Reels. You will be provided with two things:
-1. A list of audio split time ranges:{}
-2. A full transcript of the video including timestamped segments:{}
-3. A target short duration in seconds provided by the user {}
+1. A transcript of the video, one segment per line as [start-end] text, with start and end in seconds from the beginning of the video. For long videos this is only excerpts: where the times jump between two lines the speech in between was left out, so never make a short that spans such a jump:
+{}
+
+2. A target short duration in seconds provided by the user {}
 
 Your task is to generate a list of compelling short video segments. Each short should:
 - Be no longer than the user-defined target duration.
@@ -11,7 +12,7 @@ Your task is to generate a list of compelling short video segments. Each short s
 - **If the user provides 90 as the target, shorts must strictly be 90 seconds or less. Do not allow any short to exceed 90 seconds.**
 
 - Prioritize engaging, complete, and standalone moments from the transcript.
-- Avoid splitting tightly coupled sequences (like multi-step tips or grouped explanations). For example, if 3 tips are all within the allowed time window, group them into a single short even if they cross split boundaries. Keep in mind if the user is explaining or giving tips by number like tip one, two, three etc then only consider it a short content if all tips are in the allowed time period, otherwise do not consider it.
+- Avoid splitting tightly coupled sequences (like multi-step tips or grouped explanations). For example, if 3 tips are all within the allowed time window, group them into a single short even if they span many segments. Keep in mind if the user is explaining or giving tips by number like tip one, two, three etc then only consider it a short content if all tips are in the allowed time period, otherwise do not consider it.
 - Avoid segments that reference **on-screen-only elements** (e.g., "as you can see," or "tip 2 written on screen") unless all context is provided in speech.
 - Also avoid the content that includes introduction, background or what the user is, as they are not short content.
 - Ensure the resulting segments make full logical and narrative sense with no missing context.
@@ -41,7 +42,7 @@ For each short you extract, return a JSON object with the following structure. D
 
 Instructions:
 
-Base start and end times on the provided audio split segments, but feel free to merge overlapping or sequential chunks to create clean, logical shorts.
+Base start and end times on the segment timestamps of the transcript, merging sequential segments to create clean, logical shorts.
 
 Include only complete thoughts or narrative arcs (avoid abrupt starts or ends).
 
@@ -115,4 +116,44 @@ Make sure:
 - You return only ONE JSON object. No commentary, no markdown, no formatting—just the raw JSON.
 
 
+"""
+
+
+SHORTS_BATCH_ENHANCEMENT_PROMPT="""
+You are an expert short-form video editor. You will be given:
+1. A JSON list of shorts, each with its id and a word-by-word transcript with timestamps: {}
+
+Your job is to enhance every short by **accurately trimming its start and end time** based on its word-level transcript. This ensures each short:
+- Starts on the most **engaging and relevant first word or sentence**.
+- Ends cleanly on a **complete and meaningful sentence**, avoiding trailing words like "yeah", "so", "you know", etc.
+- Removes unnecessary intros/outros, awkward silences, or filler words at the edges of the clip.
+
+Be precise: use each short's own transcript to align its start and end exactly with the spoken content. Shorts are independent, never mix words between shorts.
+
+Respond ONLY with a JSON list holding one object per short, in this format:
+
+[
+{{
+  "id": integer,    // the id of the short this object belongs to
+  "title": string,
+  "start": float,   // updated start time (in seconds, as float) based on word timestamps
+  "end": float,     // updated end time (in seconds, as float) based on word timestamps
+  "hook": string,
+  "main_topic": string,
+  "content_type": string,
+  "summary": string,
+  "clip_label": string,    // Hook | Insight | Educational | Story | Controversial | Question
+  "hook_strength": string, // re-evaluate after trimming: High | Medium | Low
+  "confidence_score": integer  // re-evaluate after trimming: 0-100. Be critical — most clips should land 55–75. Only score above 85 if the clip is genuinely exceptional.
+}}
+]
+
+Make sure:
+- You return exactly one object for every id you were given.
+- You do NOT alter the meaning or structure of any short.
+- You ONLY improve timing accuracy based on actual spoken words.
+- You RE-EVALUATE hook_strength and confidence_score after trimming — a tighter, cleaner clip may score higher.
+- You return only the JSON list. No commentary, no markdown, no formatting—just the raw JSON.
+
+
 """
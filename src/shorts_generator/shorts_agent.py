@@ -1,37 +1,177 @@
+import hashlib
 import json
+from concurrent.futures import ThreadPoolExecutor,as_completed
+from typing import get_args,get_origin
 
-from google import genai
 from loguru import logger
+from pydantic import TypeAdapter
 
 from config import get_settings
-from shorts_generator.prompt import SHORTS_TOPIC_PROMPT,SHORT_ENHANCEMENT_PROPMT
+from shorts_generator.boundary_snapper import BoundarySnapper
+from shorts_generator.cache import get_cache,make_key
+from shorts_generator.clip import EnhancedClip,JsonArrayStream,ShortClip,validate_clip
+from shorts_generator.llm_providers import get_provider
+from shorts_generator.prompt import SHORTS_TOPIC_PROMPT,SHORT_ENHANCEMENT_PROPMT,SHORTS_BATCH_ENHANCEMENT_PROMPT
+from shorts_generator.transcript import TranscriptTimeline
+from shorts_generator.window_ranker import WindowRanker
 
 
 logger = logger.bind(name="TimeStampAgent")
 settings = get_settings()
 
+# Shorts may overlap by this many seconds, as the topic prompt allows
+MAX_CLIP_OVERLAP = 5
+# Extra seconds a candidate may run over shorts_time, the 2-3 seconds of padding the prompt asks for on each side
+CLIP_DURATION_TOLERANCE = 6
+# Seconds a clip may reach past a pre-filtered range, the padding the prompt asks for
+MAX_GAP_OVERLAP = 3
+
+
+def normalize(value):
+    """
+    Return the value with strings stripped and floats rounded to milliseconds,
+    so inputs that only differ in noise hash the same
+    """
+
+    if isinstance(value,float):
+        return round(value,3)
+    if isinstance(value,str):
+        return value.strip()
+    if isinstance(value,dict):
+        return {key: normalize(item) for key,item in value.items()}
+    if isinstance(value,(list,tuple)):
+        return [normalize(item) for item in value]
+
+    return value
+
+
+def key_config(config:dict):
+    """
+    Return the request config as it goes into a cache key, the response schema
+    as its json schema so a change to the clip fields or validation invalidates old entries
+    """
+
+    if not config or "response_schema" not in config:
+        return config
+
+    return {**config,"response_schema": TypeAdapter(config["response_schema"]).json_schema()}
+
+
+def reduce_clips(candidates:list,shorts_time:int,max_clips:int) -> list:
+    """
+    Return the best candidate clips in video order.
+    Candidates are ranked by confidence_score and picked greedily,
+    skipping clips too long for shorts_time, overlapping a picked clip for more
+    than MAX_CLIP_OVERLAP seconds or repeating the main topic of a picked clip.
+    """
+
+    valid = []
+
+    for clip in candidates:
+        if not ShortsAgent.valid_timestamp(clip):
+            continue
+        if clip["end"] - clip["start"] > shorts_time + CLIP_DURATION_TOLERANCE:
+            continue
+        valid.append(clip)
+
+    valid.sort(key=lambda clip: clip.get("confidence_score") if isinstance(clip.get("confidence_score"),(int,float)) else 0,reverse=True)
+
+    picked = []
+    topics = set()
+
+    for clip in valid:
+        if len(picked) >= max_clips:
+            break
+
+        topic = str(clip.get("main_topic","")).strip().lower()
+        if topic and topic in topics:
+            continue
+
+        if any(min(clip["end"],other["end"]) - max(clip["start"],other["start"]) > MAX_CLIP_OVERLAP for other in picked):
+            continue
+
+        picked.append(clip)
+        if topic:
+            topics.add(topic)
+
+    return sorted(picked,key=lambda clip: clip["start"])
+
 class ShortsAgent:
-    def __init__(self,transcriptions:list,timestamps:list):
-        self.client = genai.Client(api_key=settings.GEMINI_API_KEY)
-        self.audio_transcriptions = transcriptions
-        self.audio_split_timestamps = timestamps
+    def __init__(self,timeline:TranscriptTimeline,audio_path:str=None):
+        self.provider = get_provider(settings.SHORTS_LLM_PROVIDER)
+        self.timeline = timeline
+        # Parts of a long video the topic prompt sees, None sends the whole transcript
+        self.ranges = self.prefilter_ranges(audio_path) if self.use_prefilter() else None
+        self.cache = get_cache("llm",settings.LLM_CACHE_BACKEND,settings.LLM_CACHE_MAX_MB,settings.LLM_CACHE_TTL)
 
-        logger.info(f"ShortsAgent Agent Initilized\n TimeStamp Model: {settings.SHORTS_MODEL}")
+        logger.info(f"ShortsAgent Agent Initilized\n LLM Provider: {self.provider.name}\n TimeStamp Model: {settings.SHORTS_MODEL}\n Enhance Model: {settings.SHORTS_ENHANCE_MODEL}\n LLM Cache: {settings.LLM_CACHE_BACKEND}{' (bypassed)' if settings.LLM_CACHE_BYPASS else ''}")
 
-    def video_timestamps(self,shorts_time:int):
+    def structured_config(self,config:dict,schema) -> dict:
+        """
+        Return the request config constraining the response to the schema when structured output is enabled
+        """
+
+        if schema is None or not settings.SHORTS_STRUCTURED_OUTPUT:
+            return config
+
+        return {**(config or {}),"response_mime_type": "application/json","response_schema": schema}
 
+    def cached_response(self,model:str,template:str,inputs:tuple,config:dict) -> tuple:
+        """
+        Return the cache key of a request and its cached response or None.
+        Keys are the provider, model, prompt template hash and normalized inputs hash,
+        LLM_CACHE_BYPASS skips cached responses but still refreshes them.
         """
-        Return the final json containing 
-        detailed timestamps.
 
+        key = make_key(self.provider.name,model,hashlib.sha256(template.encode()).digest(),normalize(inputs),key_config(config))
+
+        if self.cache is None or settings.LLM_CACHE_BYPASS:
+            return key,None
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            logger.info(f"LLM response served from cache ({self.cache.stats()})")
+
+        return key,cached
+
+    @staticmethod
+    def validate(output,schema):
+        """
+        Validate the parsed response against the schema.
+        In a list the malformed clips are dropped, a single malformed clip raises.
         """
 
-        response = self.client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=SHORTS_TOPIC_PROMPT.format(self.audio_split_timestamps,self.audio_transcriptions,shorts_time),
-        )
+        if schema is None or not settings.SHORTS_STRUCTURED_OUTPUT:
+            return output
+
+        if get_origin(schema) is list:
+            model = get_args(schema)[0]
+            clips = [validate_clip(item,model) for item in output] if isinstance(output,list) else []
+            return [clip for clip in clips if clip is not None]
+
+        clip = validate_clip(output,schema)
+        if clip is None:
+            raise ValueError("Response does not match the clip schema")
+
+        return clip
+
+    def generate(self,template:str,*inputs,config:dict=None,schema=None,model:str=None):
+        """
+        Fill the prompt template with the inputs, call the model (SHORTS_MODEL by default) and return the parsed json.
+        With SHORTS_STRUCTURED_OUTPUT the response is constrained to and validated against the schema.
+        Responses are cached, a response that fails to parse or has no valid clips is never cached.
+        """
+
+        model = model or settings.SHORTS_MODEL
+        config = self.structured_config(config,schema)
+        key,cached = self.cached_response(model,template,inputs,config)
+
+        if cached is not None:
+            return cached
+
+        response_text = self.provider.generate(model,template.format(*inputs),config)
 
-        lines = response.text.strip().splitlines()
+        lines = response_text.strip().splitlines()
         if lines and lines[0].strip().startswith("```"):
             lines = lines[1:]
         if lines and lines[-1].strip() == "```":
@@ -40,14 +180,228 @@ class ShortsAgent:
 
         print(response_text)
 
+        output = self.validate(self.postprocess(response_text),schema)
+
+        # No clips at all is not worth replaying to a retried job for the whole ttl
+        if self.cache is not None and output != []:
+            self.cache.set(key,output)
+
+        return output
+
+    def stream_clips(self,template:str,*inputs):
+        """
+        Fill the prompt template with the inputs and yield the clips of the
+        streamed response, each as soon as its json object is complete.
+        Malformed clips are skipped, the whole list is cached once the stream ends unless it is empty.
+        """
+
+        model = settings.SHORTS_MODEL
+        config = self.structured_config(None,list[ShortClip])
+        key,cached = self.cached_response(model,template,inputs,config)
+
+        if cached is not None:
+            yield from cached
+            return
+
+        parser = JsonArrayStream()
+        clips = []
+
+        for text in self.provider.generate_stream(model,template.format(*inputs),config):
+            for data in parser.feed(text):
+                clip = validate_clip(data)
+                if clip is None:
+                    continue
+                # The consumer annotates the yielded clip, the cache keeps the model output
+                clips.append(dict(clip))
+                logger.info(f"\nClip {len(clips)} streamed: {clip['title']} ({clip['start']} - {clip['end']})")
+                yield clip
+
+        if self.cache is not None and clips:
+            self.cache.set(key,clips)
+
+    def iter_video_timestamps(self,shorts_time:int):
+        """
+        Yield the selected shorts one by one.
+        With SHORTS_STRUCTURED_OUTPUT a single pass selection is streamed,
+        so the first short can be cut before the model has finished its answer.
+        """
+
+        if not settings.SHORTS_STRUCTURED_OUTPUT or self.use_map_reduce():
+            yield from self.video_timestamps(shorts_time)
+            return
+
+        transcript = self.timeline.to_compact(self.candidate_segments())
+
+        if settings.PROMPT_TOKEN_REPORT:
+            self.token_report(SHORTS_TOPIC_PROMPT.format(transcript,shorts_time),SHORTS_TOPIC_PROMPT.format(self.timeline.segments,shorts_time))
+
+        for clip in self.stream_clips(SHORTS_TOPIC_PROMPT,transcript,shorts_time):
+            clip = self.fit_to_ranges(clip)
+            if clip is not None:
+                yield clip
+
         logger.info("Succesfully generated timestamps")
 
-        output = response_text
+    def video_timestamps(self,shorts_time:int):
+
+        """
+        Return the final json containing 
+        detailed timestamps.
+
+        """
+
+        if self.use_map_reduce():
+            return self.map_reduce_timestamps(shorts_time)
+
+        transcript = self.timeline.to_compact(self.candidate_segments())
+
+        if settings.PROMPT_TOKEN_REPORT:
+            self.token_report(SHORTS_TOPIC_PROMPT.format(transcript,shorts_time),SHORTS_TOPIC_PROMPT.format(self.timeline.segments,shorts_time))
+
+        return self.select_clips(transcript,shorts_time)
+
+    def select_clips(self,transcript:str,shorts_time:int) -> list:
+        """
+        Return the clips the model selects from a compact transcript
+        """
+
+        output = self.generate(SHORTS_TOPIC_PROMPT,transcript,shorts_time,schema=list[ShortClip])
+
+        if isinstance(output,list):
+            output = [clip for clip in map(self.fit_to_ranges,output) if clip is not None]
+
+        logger.info("Succesfully generated timestamps")
+
+        return output
+
+    def use_prefilter(self) -> bool:
+        return settings.SHORTS_PREFILTER and self.timeline.duration > settings.SHORTS_PREFILTER_MIN_DURATION
+
+    def prefilter_ranges(self,audio_path:str=None) -> list:
+        """
+        Return the time ranges kept by the pre-filter, each widened to
+        the segments running over its edges so it spans exactly the speech the model sees
+        """
 
-        processed_output = self.postprocess(output)
+        ranges = []
 
-        return processed_output
+        for low,high in WindowRanker(audio_path).select(self.timeline):
+            segments = self.timeline.segments_between(low,high)
+            if segments:
+                ranges.append((min(low,segments[0]["start"]),max(high,segments[-1]["end"])))
+
+        return ranges
+
+    def candidate_segments(self,start:float=0.0,end:float=float("inf")) -> list:
+        """
+        Return the segments between start and end the topic prompt sees,
+        for a pre-filtered video only those inside the kept ranges
+        """
+
+        segments = self.timeline.segments_between(start,end)
+
+        if self.ranges is None:
+            return segments
+
+        return [
+            segment for segment in segments
+            if any(segment["start"] < high and low < segment["end"] for low,high in self.ranges)
+        ]
+
+    def fit_to_ranges(self,clip):
+        """
+        Return the clip kept inside the pre-filtered ranges the model saw.
+        A clip spanning left out speech is clamped to the range holding most of it,
+        or dropped (None) if less than half of it would be left.
+        """
+
+        if not self.ranges or not self.valid_timestamp(clip):
+            return clip
+
+        low,high = max(self.ranges,key=lambda bounds: min(clip["end"],bounds[1]) - max(clip["start"],bounds[0]))
+
+        if clip["start"] >= low - MAX_GAP_OVERLAP and clip["end"] <= high + MAX_GAP_OVERLAP:
+            return clip
+
+        start,end = max(clip["start"],low),min(clip["end"],high)
+
+        if end - start < (clip["end"] - clip["start"]) / 2:
+            logger.warning(f"Dropping clip {clip['start']} - {clip['end']}, most of it was left out by the pre-filter")
+            return None
+
+        logger.info(f"Clamped clip {clip['start']} - {clip['end']} to the pre-filtered range {low} - {high}")
+
+        return {**clip,"start": start,"end": end}
+
+    def use_map_reduce(self) -> bool:
+        if settings.SHORTS_SELECTION_MODE == "auto":
+            return self.timeline.duration > settings.SHORTS_MAP_REDUCE_MIN_DURATION
+
+        return settings.SHORTS_SELECTION_MODE == "map_reduce"
+
+    def map_reduce_timestamps(self,shorts_time:int) -> list:
+        """
+        Select the shorts of a long video window by window.
+        Overlapping transcript windows are scored by parallel topic prompts (map),
+        then the candidate clips are deduped and ranked locally (reduce),
+        so latency stays about one window call whatever the video length.
+        """
+
+        windows = self.timeline.windows(settings.SHORTS_WINDOW_LENGTH,settings.SHORTS_WINDOW_OVERLAP)
+        transcripts = []
+
+        for start,end in windows:
+            segments = self.candidate_segments(start,end)
+            if segments:
+                transcripts.append(self.timeline.to_compact(segments))
+
+        logger.info(f"\nSelecting shorts from {len(transcripts)} transcript windows of {settings.SHORTS_WINDOW_LENGTH} seconds")
+
+        candidates = []
+        failed = 0
+
+        with ThreadPoolExecutor(max_workers=max(1,min(settings.SHORTS_WINDOW_WORKERS,len(transcripts)))) as executor:
+            futures = [executor.submit(self.select_clips,transcript,shorts_time) for transcript in transcripts]
+            for future in as_completed(futures):
+                try:
+                    output = future.result()
+                except Exception as e:
+                    logger.error(f"Selecting shorts from a transcript window failed: {e}")
+                    failed += 1
+                    continue
+                if isinstance(output,list):
+                    candidates.extend(output)
+
+        if transcripts and failed == len(transcripts):
+            raise RuntimeError("Selecting shorts failed for every transcript window")
+
+        clips = reduce_clips(candidates,shorts_time,settings.SHORTS_MAX_CLIPS)
+
+        logger.info(f"Reduced {len(candidates)} candidate clips from {len(transcripts)} windows to {len(clips)} shorts")
+
+        return clips
     
+    def count_tokens(self,text:str) -> int:
+        """
+        Return the prompt tokens of the text, estimated at 4 characters per token if counting fails
+        """
+
+        try:
+            return self.provider.count_tokens(settings.SHORTS_MODEL,text)
+        except Exception as e:
+            logger.warning(f"Token count failed, estimating from characters: {e}")
+            return len(text) // 4
+
+    def token_report(self,prompt:str,dict_prompt:str):
+        """
+        Log the prompt tokens of the compact (and pre-filtered) transcript against the full segment dicts it replaced
+        """
+
+        compact = self.count_tokens(prompt)
+        verbose = self.count_tokens(dict_prompt)
+
+        logger.info(f"\nTopic prompt tokens: {compact} compact vs {verbose} as segment dicts ({1 - compact / max(verbose,1):.0%} saved)")
+
     def enhance_video_timestamps(self,word_transcription):
         """
         Return the final json containing 
@@ -55,29 +409,137 @@ class ShortsAgent:
 
         """
 
-        response = self.client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=SHORT_ENHANCEMENT_PROPMT.format(word_transcription),
+        output = self.generate(SHORT_ENHANCEMENT_PROPMT,word_transcription,schema=ShortClip,model=settings.SHORTS_ENHANCE_MODEL)
+
+        logger.info("Succesfully generated timestamps")
+
+        return output
+
+
+    @staticmethod
+    def original_timestamps(item:dict) -> dict:
+        """
+        Return the first pass short with its times relative to the cut v1 short,
+        used in place of an enhancement that failed
+        """
+
+        original = {key: value for key,value in item.items() if key not in ("source_start","source_end")}
+        original["start"] = round(max(item["start"] - item["source_start"],0),3)
+        original["end"] = round(item["end"] - item["source_start"],3)
+
+        return original
+
+    @staticmethod
+    def valid_timestamp(timestamp) -> bool:
+        return (
+            isinstance(timestamp,dict)
+            and isinstance(timestamp.get("start"),(int,float))
+            and isinstance(timestamp.get("end"),(int,float))
+            and timestamp["end"] > timestamp["start"]
         )
 
-        lines = response.text.strip().splitlines()
-        if lines and lines[0].strip().startswith("```"):
-            lines = lines[1:]
-        if lines and lines[-1].strip() == "```":
-            lines = lines[:-1]
-        response_text = "\n".join(lines)
+    def enhance_concurrent(self,short_transcriptions:list) -> list:
+        """
+        Enhance the shorts with up to SHORTS_ENHANCE_WORKERS calls in flight,
+        returns the enhanced timestamps in order with None for failed shorts
+        """
 
-        print(response_text)
+        results = [None] * len(short_transcriptions)
+        pending = [(index,short) for index,short in enumerate(short_transcriptions) if "error" not in short]
 
-        logger.info("Succesfully generated timestamps")
+        if not pending:
+            return results
 
-        output = response_text
+        with ThreadPoolExecutor(max_workers=min(settings.SHORTS_ENHANCE_WORKERS,len(pending))) as executor:
+            futures = {executor.submit(self.enhance_video_timestamps,short): index for index,short in pending}
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    logger.error(f"Enhancing short {futures[future] + 1} failed: {e}")
 
-        processed_output = self.postprocess(output)
+        return results
 
-        return processed_output
+    def enhance_batch(self,short_transcriptions:list) -> list:
+        """
+        Enhance all shorts in one json request,
+        returns the enhanced timestamps in order with None for failed shorts
+        """
+
+        results = [None] * len(short_transcriptions)
+        batch = [short for short in short_transcriptions if "error" not in short]
+
+        if not batch:
+            return results
+
+        try:
+            output = self.generate(SHORTS_BATCH_ENHANCEMENT_PROMPT,json.dumps(batch),config={"response_mime_type": "application/json"},schema=list[EnhancedClip],model=settings.SHORTS_ENHANCE_MODEL)
+        except Exception as e:
+            logger.error(f"Batch enhancement of {len(batch)} shorts failed: {e}")
+            return results
+
+        indexes = {short["id"]: index for index,short in enumerate(short_transcriptions)}
+
+        for timestamp in output if isinstance(output,list) else []:
+            index = indexes.get(timestamp.pop("id",None)) if isinstance(timestamp,dict) else None
+            if index is not None:
+                results[index] = timestamp
+
+        logger.info(f"Enhanced {sum(result is not None for result in results)} of {len(batch)} shorts in one batch")
+
+        return results
+
+    def enhance_all(self,short_transcriptions:list,video_timestamps:list,audio_path:str=None) -> list:
+        """
+        Return the final timestamps of every cut short in order.
+        With SHORTS_LOCAL_SNAPPING the shorts are first trimmed locally from their word
+        timestamps and the audio energy, only shorts trimmed with a confidence below
+        SHORTS_SNAP_CONFIDENCE are enhanced by the model, concurrently or in one batch
+        (SHORTS_ENHANCE_MODE). A short whose enhancement failed keeps its first pass timestamps.
+        """
+
+        shorts = [item for item in video_timestamps if "source_start" in item]
+        enhanced = [None] * len(shorts)
+        pending = list(range(min(len(shorts),len(short_transcriptions))))
+
+        if settings.SHORTS_LOCAL_SNAPPING:
+            snapper = BoundarySnapper(audio_path,self.timeline)
+            remaining = []
+
+            for index in pending:
+                timestamp,confidence = snapper.snap(shorts[index],short_transcriptions[index])
+                if timestamp is not None and confidence >= settings.SHORTS_SNAP_CONFIDENCE:
+                    enhanced[index] = timestamp
+                else:
+                    remaining.append(index)
+
+            logger.info(f"\nTrimmed {len(pending) - len(remaining)} of {len(pending)} shorts locally, {len(remaining)} left for the model")
+            pending = remaining
+
+        if pending:
+            batch = [short_transcriptions[index] for index in pending]
+
+            if settings.SHORTS_ENHANCE_MODE == "batch":
+                results = self.enhance_batch(batch)
+            else:
+                results = self.enhance_concurrent(batch)
+
+            for index,result in zip(pending,results):
+                enhanced[index] = result
+
+        final_timestamps = []
+
+        for index,item in enumerate(shorts):
+            timestamp = enhanced[index]
+
+            if not self.valid_timestamp(timestamp):
+                logger.warning(f"Short {index + 1} was not enhanced, keeping its first pass timestamps")
+                timestamp = self.original_timestamps(item)
+
+            final_timestamps.append(timestamp)
+
+        return final_timestamps
 
-        
     def postprocess(self,output):
         """
         Convert the string json into proper json
@@ -0,0 +1,207 @@
+import re
+from bisect import bisect_left,bisect_right
+
+from loguru import logger
+
+
+logger = logger.bind(name="Transcript")
+
+SENTENCE_END = re.compile(r"[.?!][\"')\]]*$")
+
+
+def chunk_ownership(audio_split_timestamps:list) -> dict:
+    """
+    Return the absolute [start, end) range owned by every chunk id.
+    Neighbouring chunks split their overlap in the middle, so every instant belongs to one chunk.
+    """
+
+    chunks = sorted(audio_split_timestamps,key=lambda chunk: chunk["start"])
+    ownership = {}
+
+    for index,chunk in enumerate(chunks):
+        start = float("-inf") if index == 0 else (chunks[index - 1]["end"] + chunk["start"]) / 2
+        end = float("inf") if index == len(chunks) - 1 else (chunk["end"] + chunks[index + 1]["start"]) / 2
+        ownership[chunk["id"]] = (start,end)
+
+    return ownership
+
+
+class TranscriptTimeline:
+    """
+    One ordered transcript of the whole video in absolute seconds,
+    stitched from the chunk transcriptions with the overlap duplicates removed.
+    Words and segments are indexed by time for O(log n) range lookups.
+    """
+
+    def __init__(self,segments:list,words:list,failed:list=None):
+        self.segments = segments
+        self.words = words
+        self.failed = failed or []
+
+        self.segment_starts = [segment["start"] for segment in segments]
+        self.segment_ends = [segment["end"] for segment in segments]
+        self.word_starts = [word["start"] for word in words]
+        # Words do not overlap, so their ends are sorted as well
+        self.word_ends = [word["end"] for word in words]
+
+    @classmethod
+    def from_transcriptions(cls,transcriptions:list,audio_split_timestamps:list):
+        """
+        Stitch the chunk transcriptions into one timeline.
+        Segments and words are kept by the chunk owning their start,
+        so the copies transcribed twice in an overlap are dropped.
+        """
+
+        chunks = {chunk["id"]: chunk for chunk in audio_split_timestamps}
+        ownership = chunk_ownership(audio_split_timestamps)
+
+        segments = []
+        words = []
+        failed = []
+
+        for transcription in sorted(transcriptions,key=lambda transcription: transcription["id"]):
+            chunk = chunks[transcription["id"]]
+
+            if "error" in transcription:
+                logger.warning(f"Chunk {transcription['id']} has no transcription: {transcription['error']}")
+                failed.append((chunk["start"],chunk["end"]))
+                continue
+
+            offset = chunk["start"]
+            owned_start,owned_end = ownership[transcription["id"]]
+
+            for segment in transcription.get("text_with_timestamps",[]):
+                start,end = segment["start"] + offset,segment["end"] + offset
+                if not owned_start <= start < owned_end:
+                    continue
+
+                # Timestamps of the same speech drift between chunks, drop a segment mostly covered by the previous one
+                if segments and min(end,segments[-1]["end"]) - start > (end - start) / 2:
+                    continue
+
+                segments.append({"start": round(start,3),"end": round(end,3),"text": segment["text"].strip()})
+
+            for word in transcription.get("word_with_timestamps",[]):
+                start = word["start"] + offset
+                if owned_start <= start < owned_end:
+                    words.append({"start": round(start,3),"end": round(word["end"] + offset,3),"word": word["word"]})
+
+        segments.sort(key=lambda segment: segment["start"])
+        words.sort(key=lambda word: word["start"])
+
+        for id,segment in enumerate(segments):
+            segment["id"] = id
+
+        logger.info(f"Stitched {len(transcriptions)} chunks into {len(segments)} segments and {len(words)} words")
+
+        return cls(segments,words,failed)
+
+    @property
+    def duration(self) -> float:
+        return max(self.segment_ends,default=0.0)
+
+    def windows(self,length:float,overlap:float) -> list:
+        """
+        Return (start, end) windows of length seconds covering the transcript,
+        neighbours overlap by overlap seconds so a clip on a boundary is whole in one window
+        """
+
+        step = max(length - overlap,1.0)
+        windows = []
+        start = 0.0
+
+        while True:
+            windows.append((start,start + length))
+            if start + length >= self.duration:
+                break
+            start += step
+
+        return windows
+
+    def words_between(self,start:float,end:float) -> list:
+        """
+        Return the words spoken completely between start and end
+        """
+
+        return self.words[bisect_left(self.word_starts,start):bisect_right(self.word_ends,end)]
+
+    def sentence_ends(self,start:float,end:float) -> list:
+        """
+        Return the end times of the words between start and end that finish a sentence.
+        Whisper word tokens carry no punctuation, so a sentence ends with the last word
+        of a segment whose text ends in . ? or !
+        """
+
+        ends = []
+
+        for segment in self.segments_between(start,end):
+            if not SENTENCE_END.search(segment["text"].strip()):
+                continue
+
+            # The last word starting inside the segment
+            index = bisect_left(self.word_starts,segment["end"]) - 1
+            if index >= 0 and self.words[index]["start"] >= segment["start"] and self.words[index]["end"] <= end:
+                ends.append(self.words[index]["end"])
+
+        return ends
+
+    def segments_between(self,start:float,end:float) -> list:
+        """
+        Return the segments overlapping start and end
+        """
+
+        return self.segments[bisect_right(self.segment_ends,start):bisect_left(self.segment_starts,end)]
+
+    def to_compact(self,segments:list=None) -> str:
+        """
+        Return the segments (all by default) as one "[start-end] text" line each,
+        absolute seconds with one decimal. This is the transcript the prompts see,
+        a fraction of the tokens of the segment dicts.
+        """
+
+        segments = self.segments if segments is None else segments
+
+        return "\n".join(f"[{segment['start']:.1f}-{segment['end']:.1f}] {segment['text']}" for segment in segments)
+
+    def overlaps_failed(self,start:float,end:float) -> bool:
+        """
+        Return True if a chunk between start and end could not be transcribed
+        """
+
+        return any(failed_start < end and start < failed_end for failed_start,failed_end in self.failed)
+
+
+def short_transcriptions_from_timeline(timeline:TranscriptTimeline,video_timestamps:list) -> list:
+    """
+    Build the word transcription of every cut short from the first pass timeline.
+    Word times are relative to the start of the cut (source_start), like a transcription
+    of the v1 short itself. Shorts overlapping a failed chunk are flagged with an error.
+    """
+
+    short_transcriptions = []
+
+    for item in video_timestamps:
+        if "source_start" not in item:
+            continue
+
+        id = len(short_transcriptions) + 1
+        start,end = item["source_start"],item["source_end"]
+
+        if timeline.overlaps_failed(start,end):
+            short_transcriptions.append({"id": id,"error": "chunk transcription failed"})
+            continue
+
+        short_words = [
+            {"start": round(word["start"] - start,3),"end": round(word["end"] - start,3),"word": word["word"]}
+            for word in timeline.words_between(start,end)
+        ]
+
+        short_transcriptions.append({
+            "id": id,
+            "text": " ".join(word["word"].strip() for word in short_words),
+            "word_with_timestamps": short_words,
+        })
+
+    logger.info(f"Sliced word timestamps of {len(short_transcriptions)} shorts from the first pass")
+
+    return short_transcriptions
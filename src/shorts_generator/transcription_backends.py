@@ -0,0 +1,247 @@
+import asyncio
+import os
+import threading
+from abc import ABC,abstractmethod
+from functools import lru_cache
+
+import groq
+from groq import AsyncGroq,Groq
+from loguru import logger
+
+from config import get_settings
+from shorts_generator.audio_utils import audio_digest,audio_duration,audio_name,open_audio
+
+
+logger = logger.bind(name="TranscriptionBackend")
+settings = get_settings()
+
+STUB_WORDS = [
+    "so","today","we","are","going","to","talk","about","the","one","idea",
+    "that","changed","how","I","build","products","and","why","it","matters",
+]
+STUB_WORD_SECONDS = 0.4
+STUB_SEGMENT_WORDS = 10
+
+
+def parse_verbose_json(transcription) -> dict:
+    """
+    Return the text, segments and words of a verbose_json transcription
+    """
+
+    return {
+        "text": transcription.text,
+        "segments": [
+            {
+                "id": item["id"],
+                "start": item["start"],
+                "end": item["end"],
+                "text": item["text"]
+            }
+            for item in getattr(transcription,"segments",None) or []],
+        "words": [
+            {
+                "start": item["start"],
+                "end": item["end"],
+                "word": item["word"]
+            }
+            for item in getattr(transcription,"words",None) or []],
+    }
+
+
+class TranscriptionBackend(ABC):
+    """
+    A speech to text engine. transcribe takes an audio path or in-memory audio buffer
+    and returns {"text", "segments", "words"} with times relative to the audio start.
+    """
+
+    name = ""
+    model = ""
+    # Errors worth retrying after a backoff
+    retryable_errors = ()
+    # Fixed number of requests in flight, None lets the engine adapt it
+    max_concurrency = None
+
+    @abstractmethod
+    def transcribe(self,audio,**params) -> dict:
+        pass
+
+    async def atranscribe(self,audio,**params) -> dict:
+        return await asyncio.to_thread(self.transcribe,audio,**params)
+
+    def is_throttled(self,error:Exception) -> bool:
+        return False
+
+    async def aclose(self):
+        pass
+
+
+class GroqBackend(TranscriptionBackend):
+    """
+    Whisper on the Groq api, files are uploaded streamed
+    """
+
+    name = "groq"
+    retryable_errors = (groq.RateLimitError,groq.APIConnectionError,groq.InternalServerError)
+
+    def __init__(self):
+        self.model = settings.AUDIO_TRANSCRIBE_MODEL
+        self.client = Groq(api_key=settings.GROQ_API_KEY,base_url=settings.GROQ_BASE_URL)
+        self.async_client = None
+
+    def is_throttled(self,error:Exception) -> bool:
+        return isinstance(error,groq.RateLimitError)
+
+    def transcribe(self,audio,**params) -> dict:
+        with open_audio(audio) as file:
+            transcription = self.client.audio.transcriptions.create(
+                file=(audio_name(audio),file),
+                model=self.model,
+                response_format="verbose_json",
+                **params
+            )
+
+        return parse_verbose_json(transcription)
+
+    async def atranscribe(self,audio,**params) -> dict:
+        # The async client is bound to the event loop, it is created per run and closed by aclose
+        if self.async_client is None:
+            self.async_client = AsyncGroq(
+                api_key=settings.GROQ_API_KEY,
+                base_url=settings.GROQ_BASE_URL,
+                timeout=settings.TRANSCRIBE_TIMEOUT,
+                max_retries=0
+            )
+
+        with open_audio(audio) as file:
+            transcription = await self.async_client.audio.transcriptions.create(
+                file=(audio_name(audio),file),
+                model=self.model,
+                response_format="verbose_json",
+                **params
+            )
+
+        return parse_verbose_json(transcription)
+
+    async def aclose(self):
+        if self.async_client is not None:
+            await self.async_client.close()
+            self.async_client = None
+
+
+class FasterWhisperBackend(TranscriptionBackend):
+    """
+    Whisper on the local CPU with faster-whisper (CTranslate2),
+    LOCAL_WHISPER_WORKERS transcriptions run in parallel sharing the cores
+    """
+
+    name = "local"
+
+    def __init__(self):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise ImportError("The local transcription backend requires faster-whisper, install it with `uv sync --extra local`") from e
+
+        self.model = f"{settings.LOCAL_WHISPER_MODEL}-{settings.LOCAL_WHISPER_COMPUTE_TYPE}"
+        self.max_concurrency = settings.LOCAL_WHISPER_WORKERS
+        self.slots = threading.Semaphore(settings.LOCAL_WHISPER_WORKERS)
+
+        self.whisper = WhisperModel(
+            settings.LOCAL_WHISPER_MODEL,
+            device="cpu",
+            compute_type=settings.LOCAL_WHISPER_COMPUTE_TYPE,
+            cpu_threads=max(1,(os.cpu_count() or 1) // settings.LOCAL_WHISPER_WORKERS),
+            num_workers=settings.LOCAL_WHISPER_WORKERS,
+        )
+
+        logger.info(f"Loaded local whisper model {self.model} with {settings.LOCAL_WHISPER_WORKERS} workers")
+
+    def transcribe(self,audio,**params) -> dict:
+        word_timestamps = "word" in params.get("timestamp_granularities",[])
+
+        with self.slots,open_audio(audio) as file:
+            segments,_ = self.whisper.transcribe(
+                file,
+                beam_size=settings.LOCAL_WHISPER_BEAM_SIZE,
+                word_timestamps=word_timestamps,
+                language=params.get("language"),
+            )
+            # Segments are decoded lazily while iterating
+            segments = list(segments)
+
+        return {
+            "text": "".join(segment.text for segment in segments),
+            "segments": [
+                {
+                    "id": segment.id,
+                    "start": segment.start,
+                    "end": segment.end,
+                    "text": segment.text
+                }
+                for segment in segments],
+            "words": [
+                {
+                    "start": word.start,
+                    "end": word.end,
+                    "word": word.word
+                }
+                for segment in segments for word in segment.words or []],
+        }
+
+
+class StubBackend(TranscriptionBackend):
+    """
+    Deterministic offline transcriptions for tests and benchmarks.
+    A word is spoken every STUB_WORD_SECONDS over the whole audio,
+    the words are picked from the audio digest so the same audio gives the same text.
+    """
+
+    name = "stub"
+    model = "stub"
+
+    def transcribe(self,audio,**params) -> dict:
+        duration = audio_duration(audio)
+        seed = int.from_bytes(audio_digest(audio)[:4],"big")
+
+        words = []
+        for index in range(int(duration / STUB_WORD_SECONDS)):
+            start = index * STUB_WORD_SECONDS
+            word = STUB_WORDS[(seed + index) % len(STUB_WORDS)]
+            words.append({"start": round(start,3),"end": round(start + STUB_WORD_SECONDS * 0.8,3),"word": word})
+
+        segments = []
+        for index in range(0,len(words),STUB_SEGMENT_WORDS):
+            segment_words = words[index:index + STUB_SEGMENT_WORDS]
+            segments.append({
+                "id": len(segments),
+                "start": segment_words[0]["start"],
+                "end": segment_words[-1]["end"],
+                # Like whisper, the punctuation is in the segment text and not in the word tokens
+                "text": " " + " ".join(word["word"] for word in segment_words) + ".",
+            })
+
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "words": words,
+        }
+
+
+BACKENDS = {
+    "groq": GroqBackend,
+    "local": FasterWhisperBackend,
+    "stub": StubBackend,
+}
+
+
+@lru_cache
+def get_backend(name:str) -> TranscriptionBackend:
+    """
+    Return the transcription backend of the name, created once per process
+    so the local model is only loaded once
+    """
+
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown transcription backend: {name}")
+
+    return BACKENDS[name]()
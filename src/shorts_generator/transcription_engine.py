@@ -0,0 +1,245 @@
+import asyncio
+import random
+import time
+
+from loguru import logger
+
+from config import get_settings
+from shorts_generator.audio_trancriber import AudioTranscriber
+from shorts_generator.audio_utils import audio_digest
+
+
+logger = logger.bind(name="TranscriptionEngine")
+settings = get_settings()
+
+
+class AdaptiveLimiter:
+    """
+    Bound on the requests in flight, adjusted additive increase / multiplicative decrease.
+    The limit grows by one after a full window of responses faster than the target latency
+    and is halved on a rate limit or a response slower than twice the target.
+    """
+
+    def __init__(self,initial:int,minimum:int,maximum:int,target_latency:float):
+        self.limit = max(minimum,min(initial,maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self.successes = 0
+        self.last_decrease = 0.0
+        self.latencies = []
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self,latency:float,throttled:bool=False):
+        async with self.condition:
+            self.in_flight -= 1
+            self.latencies.append(latency)
+            now = time.monotonic()
+
+            if throttled or latency > 2 * self.target_latency:
+                # Requests already in flight saw the same congestion, decrease once per round trip
+                if now - self.last_decrease > latency:
+                    self.limit = max(self.minimum,self.limit // 2)
+                    self.last_decrease = now
+                    self.successes = 0
+                    logger.info(f"Transcription concurrency decreased to {self.limit}")
+            elif latency <= self.target_latency:
+                self.successes += 1
+                if self.successes >= self.limit and self.limit < self.maximum:
+                    self.limit += 1
+                    self.successes = 0
+
+            self.condition.notify_all()
+
+    def report(self) -> str:
+        if not self.latencies:
+            return f"0 requests, concurrency {self.limit}"
+
+        latencies = sorted(self.latencies)
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[min(len(latencies) - 1,int(len(latencies) * 0.95))]
+
+        return f"{len(latencies)} requests, p50 {p50:.2f}s, p95 {p95:.2f}s, max {latencies[-1]:.2f}s, concurrency {self.limit}"
+
+
+def backoff_delay(attempt:int,error:Exception) -> float:
+    """
+    Return the full jitter backoff delay of a retry, at least the server retry-after
+    """
+
+    delay = random.uniform(0,min(settings.TRANSCRIBE_BACKOFF_MAX,settings.TRANSCRIBE_BACKOFF_BASE * 2 ** attempt))
+
+    response = getattr(error,"response",None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+
+    try:
+        return max(delay,float(retry_after))
+    except (TypeError,ValueError):
+        return delay
+
+
+class TranscriptionEngine:
+    """
+    Transcribes many audio files concurrently on the transcription backend.
+    Requests in flight are bounded by an AdaptiveLimiter, retryable failures are
+    retried with jittered backoff and throttled requests spill over to the fallback backend.
+    """
+
+    def __init__(self,transcriber:AudioTranscriber):
+        self.transcriber = transcriber
+        self.backend = transcriber.backend
+        self.fallback = transcriber.fallback
+        self.cache = transcriber.cache
+        # The learned limit carries over to the next run of the same job
+        self.limit = self.backend.max_concurrency or settings.TRANSCRIBE_INITIAL_CONCURRENCY
+        self.fallback_slots = None
+
+        logger.info(f"TranscriptionEngine Initilized\n Backend: {self.backend.name}\n Concurrency: {self.limiter_bounds()}\n Max Retries: {settings.TRANSCRIBE_MAX_RETRIES}")
+
+    def limiter_bounds(self) -> tuple:
+        """
+        Return the minimum and maximum requests in flight, fixed for backends with a set concurrency
+        """
+
+        if self.backend.max_concurrency:
+            return self.backend.max_concurrency,self.backend.max_concurrency
+
+        return settings.TRANSCRIBE_MIN_CONCURRENCY,settings.TRANSCRIBE_MAX_CONCURRENCY
+
+    async def cached(self,backend,audio,id,params) -> tuple:
+        """
+        Return the cache key of the request and the cached transcription or None
+        """
+
+        key = self.transcriber.request_key(backend,await asyncio.to_thread(audio_digest,audio),params)
+
+        if self.cache is None:
+            return key,None
+
+        cached = await asyncio.to_thread(self.cache.get,key)
+        if cached is not None:
+            logger.info(f"\nAudio {id} served from cache ({self.cache.stats()})")
+
+        return key,cached
+
+    async def transcribe(self,limiter:AdaptiveLimiter,audio,id,**params) -> dict:
+        """
+        Transcribe one audio path or buffer, served from the transcription cache when possible
+        """
+
+        backend = self.backend
+        key,result = await self.cached(backend,audio,id,params)
+        if result is not None:
+            return result
+
+        for attempt in range(settings.TRANSCRIBE_MAX_RETRIES + 1):
+            await limiter.acquire()
+            started = time.monotonic()
+            throttled = False
+
+            try:
+                result = await backend.atranscribe(audio,**params)
+                break
+            except backend.retryable_errors as e:
+                throttled = backend.is_throttled(e)
+                if attempt == settings.TRANSCRIBE_MAX_RETRIES:
+                    raise
+                delay = backoff_delay(attempt,e)
+                logger.warning(f"Audio {id} transcription failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            finally:
+                await limiter.release(time.monotonic() - started,throttled)
+
+            # Spill a throttled request over to a free slot of the fallback backend instead of waiting
+            if throttled and self.fallback is not None and not self.fallback_slots.locked():
+                async with self.fallback_slots:
+                    logger.warning(f"Audio {id} throttled on {backend.name}, transcribing on {self.fallback.name}")
+                    backend = self.fallback
+                    key,result = await self.cached(backend,audio,id,params)
+                    if result is None:
+                        result = await backend.atranscribe(audio,**params)
+                break
+
+            await asyncio.sleep(delay)
+
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.set,key,result)
+
+        logger.info(f"\nAudio {id} trasncribed successfully on {backend.name}")
+
+        return result
+
+    async def run(self,items,transcript,**params) -> list:
+        """
+        Transcribe the (id, audio) items and return the transcripts sorted by id.
+        Items may come from a blocking generator, the next one is pulled only when
+        a request slot is free so the audio waiting for upload stays bounded.
+        Audio still failing after the retries becomes an error entry.
+        """
+
+        minimum,maximum = self.limiter_bounds()
+        limiter = AdaptiveLimiter(self.limit,minimum,maximum,settings.TRANSCRIBE_TARGET_LATENCY)
+
+        if self.fallback is not None:
+            self.fallback_slots = asyncio.Semaphore(self.fallback.max_concurrency or 1)
+
+        async def worker(id,audio):
+            try:
+                return transcript(id,await self.transcribe(limiter,audio,id,**params))
+            except Exception as e:
+                logger.error(f"\nAudio {id} transcription failed: {e}")
+                error = {"error": str(e),"id": id}
+                if isinstance(audio,str):
+                    error["path"] = audio
+                return error
+
+        iterator = iter(items)
+        results = []
+        pending = set()
+        started = time.monotonic()
+
+        try:
+            while True:
+                while len(pending) >= limiter.limit:
+                    done,pending = await asyncio.wait(pending,return_when=asyncio.FIRST_COMPLETED)
+                    results.extend(task.result() for task in done)
+
+                item = await asyncio.to_thread(next,iterator,None)
+                if item is None:
+                    break
+
+                pending.add(asyncio.create_task(worker(*item)))
+
+            if pending:
+                done,pending = await asyncio.wait(pending)
+                results.extend(task.result() for task in done)
+        finally:
+            for task in pending:
+                task.cancel()
+            self.limit = limiter.limit
+            await self.backend.aclose()
+            if self.fallback is not None:
+                await self.fallback.aclose()
+
+        logger.info(f"Transcribed {len(results)} audio files in {time.monotonic() - started:.1f}s ({limiter.report()})")
+
+        return sorted(results,key=lambda result: result["id"])
+
+    def transcribe_chunks(self,chunks) -> list:
+        """
+        Transcribe the (id, audio) chunks with segment and word timestamps
+        """
+
+        return asyncio.run(self.run(chunks,self.transcriber.chunk_transcript,timestamp_granularities=["word","segment"]))
+
+    def transcribe_shorts(self,shorts) -> list:
+        """
+        Transcribe the (id, audio) shorts with word timestamps
+        """
+
+        return asyncio.run(self.run(shorts,self.transcriber.short_transcript,timestamp_granularities=["word"]))
@@ -2,6 +2,8 @@ import boto3
 import mimetypes
 import re
 from datetime import datetime
+from functools import lru_cache
+from botocore.config import Config
 from botocore.exceptions import NoCredentialsError
 from loguru import logger
 
@@ -10,6 +12,17 @@ from config import get_settings
 logger = logger.bind(name="Utils")
 settings = get_settings()
 
+@lru_cache(maxsize=1)
+def get_s3_client():
+    """Return a shared S3 client whose connection pool fits the parallel downloads."""
+    return boto3.client(
+        "s3",
+        aws_access_key_id=settings.AWS_ACCESS_KEY,
+        aws_secret_access_key=settings.AWS_SECRET_KEY,
+        region_name=settings.AWS_REGION,
+        config=Config(max_pool_connections=max(10,settings.DOWNLOAD_WORKERS)),
+    )
+
 def sanitize_filename(filename):
     """Convert filename to proper format: abc-xyz-timestamp.extension"""
     # Remove file extension
@@ -1,6 +1,14 @@
-import urllib.request
 import os
-from moviepy import VideoFileClip
+import re
+import subprocess
+import tempfile
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor,ThreadPoolExecutor,as_completed
+from concurrent.futures.process import BrokenProcessPool
+from moviepy import VideoFileClip,concatenate_audioclips
+from moviepy.config import FFMPEG_BINARY
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
 from moviepy.video.fx import FadeIn, FadeOut
 from moviepy.audio.fx import AudioFadeIn, AudioFadeOut, MultiplyVolume
 
@@ -9,6 +17,8 @@ from scipy.io import wavfile
 
 
 from config import get_settings
+from shorts_generator.downloader import VideoDownloader
+from shorts_generator.audio_utils import audio_extension,audio_profile_params,encode_audio,plan_chunk_length,quietest_point
 
 
 
@@ -23,19 +33,22 @@ class VideoProcessor:
         self.audio_path = audio_path
         self.split_audio = split_audio_path 
 
-        logger.info(f"VideoProcessor Initilized\n Audio Chunk: {settings.AUDIO_CHUNK_LENGTH} seconds\n Audio Overlap: {settings.AUDIO_OVERLAP_LENGTH} seconds")
+        chunk = "planned" if settings.AUDIO_CHUNK_PLANNER else f"{settings.AUDIO_CHUNK_LENGTH} seconds"
+
+        logger.info(f"VideoProcessor Initilized\n Audio Chunk: {chunk}\n Audio Overlap: {settings.AUDIO_OVERLAP_LENGTH} seconds\n Audio Profile: {settings.TRANSCRIBE_AUDIO_SAMPLE_RATE} Hz, {settings.TRANSCRIBE_AUDIO_CHANNELS} channel(s), {settings.TRANSCRIBE_AUDIO_FORMAT}")
         
     
     def download_video(self) -> str:
         """
-        Download the video from the url
+        Download the video from the url with parallel range requests,
+        resuming the parts left by a previous attempt
         """
 
         video_name = self.video_url.split("/")[-1]
 
         output_video_path = os.path.join(self.video_path,video_name)
 
-        urllib.request.urlretrieve(self.video_url,output_video_path)
+        VideoDownloader(self.video_url,output_video_path).download()
 
         logger.info(f"\nVideo Saved to path: {output_video_path}")
 
@@ -43,6 +56,74 @@ class VideoProcessor:
 
 
 
+    def ingest_video(self) -> tuple:
+        """
+        Download the video and extract its audio.
+        With STREAMING_INGEST the downloaded bytes are piped into an ffmpeg
+        audio demuxer while they arrive, so the audio is ready right after the download.
+        """
+
+        if not settings.STREAMING_INGEST:
+            output_video_path = self.download_video()
+            return output_video_path,self.extarct_audio_from_video(output_video_path)
+
+        video_name = self.video_url.split("/")[-1]
+
+        output_video_path = os.path.join(self.video_path,video_name)
+        output_audio_path = os.path.join(self.audio_path,"audio.wav")
+
+        command = [
+            FFMPEG_BINARY,"-v","error","-y",
+            "-i","pipe:0","-vn",
+            *audio_profile_params(),"-ar",str(settings.TRANSCRIBE_AUDIO_SAMPLE_RATE),
+            "-c:a","pcm_s16le","-f","wav",output_audio_path
+        ]
+
+        with tempfile.TemporaryFile() as demuxer_log:
+            demuxer = subprocess.Popen(command,stdin=subprocess.PIPE,stdout=subprocess.DEVNULL,stderr=demuxer_log)
+
+            def sink(chunk):
+                if demuxer.stdin.closed:
+                    return
+                try:
+                    demuxer.stdin.write(chunk)
+                except (BrokenPipeError,ValueError):
+                    # The demuxer gave up, keep downloading and extract from the file afterwards
+                    demuxer.stdin.close()
+
+            try:
+                VideoDownloader(self.video_url,output_video_path).download(sink)
+            finally:
+                if not demuxer.stdin.closed:
+                    try:
+                        demuxer.stdin.close()
+                    except BrokenPipeError:
+                        pass
+                demuxer.wait()
+
+            demuxer_log.seek(0)
+            error = demuxer_log.read().decode(errors="replace").strip()
+
+        logger.info(f"\nVideo Saved to path: {output_video_path}")
+
+        # mp4 files with the moov atom at the end cannot be demuxed from a pipe,
+        # in that case ffmpeg fails or writes an empty or truncated wav
+        if demuxer.returncode == 0 and os.path.exists(output_audio_path):
+            rate,data = wavfile.read(output_audio_path,mmap=True)
+            audio_length = len(data)/rate
+            del data
+        else:
+            audio_length = 0
+
+        if audio_length < ffmpeg_parse_infos(output_video_path)["duration"] - 1:
+            logger.warning(f"Streaming audio extraction failed ({error or 'incomplete audio'}), extracting from the downloaded file")
+            return output_video_path,self.extarct_audio_from_video(output_video_path)
+
+        logger.info(f"\nAudio Saved to path: {output_audio_path}")
+
+        return output_video_path,output_audio_path
+
+
     def extarct_audio_from_video(self,output_video_path:str,shorts=False,id=1,output_shorts_path=None) -> str:
         """
         Extract the audio in wav format from the video
@@ -57,7 +138,16 @@ class VideoProcessor:
         else:
             output_audio_path = os.path.join(self.audio_path,"audio.wav")
 
-        audio.write_audiofile(output_audio_path)
+        # Speech profile for transcription: mono 16 kHz pcm instead of 44.1 kHz stereo
+        audio.write_audiofile(
+            output_audio_path,
+            fps=settings.TRANSCRIBE_AUDIO_SAMPLE_RATE,
+            nbytes=2,
+            codec="pcm_s16le",
+            ffmpeg_params=audio_profile_params()
+        )
+
+        clip.close()
 
         logger.info(f"\nAudio Saved to path: {output_audio_path}")
 
@@ -69,207 +159,496 @@ class VideoProcessor:
     
     
 
-    def split_audio_in_chunks(self,output_audio_path:str) -> list:
+    def iter_audio_chunks(self,output_audio_path:str,concurrency:int=None):
         """
-        Splits the audio in to chunks and delete the audio after splitting
+        Split the audio in to chunks and yield (audio_dict, chunk) as soon as each chunk is encoded.
+        The wav is memory-mapped and chunks are encoded one at a time,
+        so memory stays bounded by the chunk size instead of the audio length.
+        The chunk is a file path, or with AUDIO_CHUNKS_IN_MEMORY an encoded in-memory buffer
+        that is released once transcribed, so buffers are bounded by the requests in flight.
+        With AUDIO_CHUNK_PLANNER the chunk length is planned from the encoded size
+        and the concurrency budget instead of the fixed AUDIO_CHUNK_LENGTH.
         """
 
-        rate,data = wavfile.read(output_audio_path)
+        rate,data = wavfile.read(output_audio_path,mmap=True)
 
-        split_at_timestamp = settings.AUDIO_CHUNK_LENGTH
-        start = 0
-        end = split_at_timestamp
-        overlap = settings.AUDIO_OVERLAP_LENGTH
-        count = 1
-        split_at_frame_start = rate * start
-        split_at_frame_end = rate * end
         audio_length = len(data)/rate
+        chunk_length = settings.AUDIO_CHUNK_LENGTH
 
-        audio_split_timestamps = []
-        split_audio_paths = []
+        if settings.AUDIO_CHUNK_PLANNER:
+            chunk_length = plan_chunk_length(data,rate,concurrency or settings.TRANSCRIBE_INITIAL_CONCURRENCY)
+            logger.info(f"\nPlanned {chunk_length} second chunks for {audio_length:.1f} seconds of audio")
+
+        start = 0
+        end = self.chunk_end(data,rate,start,audio_length,chunk_length)
+        # Silence aligned boundaries fall in pauses, so the chunks do not need to overlap
+        overlap = settings.AUDIO_OVERLAP_LENGTH if settings.AUDIO_CHUNK_BOUNDARY == "fixed" else 0
+        count = 1
+        split_at_frame_start = int(rate * start)
+        split_at_frame_end = int(rate * end)
 
         while True:
 
             audio_dict = {}
 
             split_audio = data[split_at_frame_start:split_at_frame_end]
+            last_chunk = end >= audio_length
 
             audio_dict["id"] = count
             audio_dict["start"] = start
-            audio_dict["end"] = end
-            audio_dict["overlap"] = 1
+            audio_dict["end"] = audio_length if last_chunk else end
+            audio_dict["overlap"] = overlap
 
-            audio_split_timestamps.append(audio_dict)
-            path = f'{self.split_audio}/split_audio{count}.wav'
-            wavfile.write(path, rate, split_audio)
+            name = f'split_audio{count}{audio_extension()}'
 
-            split_audio_paths.append(path)
+            if settings.AUDIO_CHUNKS_IN_MEMORY:
+                chunk = BytesIO(encode_audio(split_audio,rate))
+                chunk.name = name
+            else:
+                chunk = f'{self.split_audio}/{name}'
+                with open(chunk,"wb") as file:
+                    file.write(encode_audio(split_audio,rate))
 
-            if end > audio_length:
-                audio_split_timestamps[-1]["end"] = audio_length
+            # Drop the view so only one chunk is paged in at a time
+            del split_audio
+
+            yield audio_dict,chunk
+
+            if last_chunk:
                 break
 
             start = end - overlap
-            end = start + split_at_timestamp
-            split_at_frame_start = rate * start
-            split_at_frame_end = rate * end
+            end = self.chunk_end(data,rate,start,audio_length,chunk_length)
+            split_at_frame_start = int(rate * start)
+            split_at_frame_end = int(rate * end)
             count +=1
 
-        
-        logger.info(f"\nAudio File is splitted into {len(audio_split_timestamps)} chunks")
+        del data
 
-        # os.remove(output_audio_path)
+        logger.info(f"\nAudio File is splitted into {count} chunks")
 
-        # logger.info(f"\nRemoved the audio file from path: {output_audio_path}")
 
-        print(audio_split_timestamps)
+    def chunk_end(self,data,rate:int,start:float,audio_length:float,chunk_length:float) -> float:
+        """
+        Return the end of the chunk starting at start.
+        In silence mode the nominal boundary is moved to the quietest point
+        within AUDIO_BOUNDARY_TOLERANCE seconds so words are not split.
+        """
+
+        end = start + chunk_length
+
+        if settings.AUDIO_CHUNK_BOUNDARY == "fixed" or end >= audio_length:
+            return end
+
+        tolerance = min(settings.AUDIO_BOUNDARY_TOLERANCE,chunk_length / 2)
+
+        return round(quietest_point(data,rate,end,tolerance),3)
+
+
+    def slice_shorts_audio(self,output_audio_path:str,video_timestamps:list) -> list:
+        """
+        Slice the audio of every cut short out of the master wav.
+        The wav is memory-mapped so only the sliced samples are read,
+        and the slices are returned as in-memory encoded audio buffers.
+        """
+
+        rate,data = wavfile.read(output_audio_path,mmap=True)
+
+        shorts_audio = []
+
+        for item in video_timestamps:
+            if "source_start" not in item:
+                continue
+
+            id = len(shorts_audio) + 1
+
+            split_at_frame_start = int(rate * item["source_start"])
+            split_at_frame_end = int(rate * item["source_end"])
+
+            buffer = BytesIO(encode_audio(data[split_at_frame_start:split_at_frame_end],rate))
+            buffer.name = f"shorts_audio_{id}{audio_extension()}"
+
+            shorts_audio.append(buffer)
+
+        logger.info(f"\nSliced audio of {len(shorts_audio)} shorts from: {output_audio_path}")
+
+        del data
+
+        return shorts_audio
+
+
+    def keyframe_before(self,output_video_path:str,timestamp:float) -> float:
+        """
+        Return the time of the last video keyframe at or before the timestamp
+        """
+
+        command = [
+            FFMPEG_BINARY,"-hide_banner","-nostats",
+            "-copyts","-skip_frame","nokey","-noaccurate_seek",
+            "-ss",f"{timestamp:.3f}","-i",output_video_path,
+            "-map","0:v:0","-frames:v","1","-vf","showinfo","-f","null","-"
+        ]
+
+        result = subprocess.run(command,capture_output=True,text=True)
+        match = re.search(r"pts_time:(-?[0-9.]+)",result.stderr)
+
+        if match is None:
+            logger.warning(f"No keyframe found before {timestamp}s, cutting at {timestamp}s")
+            return timestamp
+
+        return min(max(float(match.group(1)),0.0),timestamp)
+
+
+    def stream_copy_cut(self,output_video_path:str,start_time:float,end_time:float,duration:float,output_path:str) -> tuple:
+        """
+        Remux the [start_time, end_time] window into a new file without re-encoding.
+        The cut starts on the keyframe before start_time and is padded so the
+        requested window is always covered. Returns the actual (start, end) cut.
+        """
+
+        padding = settings.SHORTS_V1_CUT_PADDING
+
+        cut_start = self.keyframe_before(output_video_path,max(start_time - padding,0))
+        cut_end = min(end_time + padding,duration)
+
+        command = [
+            FFMPEG_BINARY,"-v","error","-y",
+            "-ss",f"{cut_start:.3f}","-i",output_video_path,
+            "-t",f"{cut_end - cut_start:.3f}",
+            "-map","0:v:0?","-map","0:a:0?",
+            "-c","copy","-avoid_negative_ts","make_zero",
+            output_path
+        ]
+
+        subprocess.run(command,check=True,capture_output=True,text=True)
+
+        return cut_start,cut_end
+
+
+    @staticmethod
+    def validate_timestamps(start_time,end_time,duration,count):
+        """
+        Validate a short window against the video duration.
+        Returns the (possibly clamped) end time, or None if the short should be skipped.
+        """
+
+        if start_time < 0:
+            logger.warning(f"Invalid start_time {start_time} for short {count}, skipping")
+            return None
+
+        if end_time <= start_time:
+            logger.warning(f"Invalid end_time {end_time} <= start_time {start_time} for short {count}, skipping")
+            return None
+
+        if start_time >= duration:
+            logger.warning(f"start_time {start_time} >= video duration {duration} for short {count}, skipping")
+            return None
+
+        if end_time > duration:
+            end_time = duration
+
+        # Ensure minimum duration
+        if end_time - start_time < 0.5:
+            logger.warning(f"Clip duration too short ({end_time - start_time}s) for short {count}, skipping")
+            return None
+
+        return end_time
+
+
+    def generate_shorts_stream_copy(self,video_timestamps:list,output_video_path:str,shorts_v1):
+        """
+        Cut the first pass (v1) shorts with ffmpeg stream copy.
+        The v1 shorts are only used for transcription and as input of the
+        final render, so a lossless remux is enough and avoids re-encoding.
+        """
+
+        return self.generate_shorts_from_stream(video_timestamps,output_video_path,shorts_v1)[1]
+
+    def generate_shorts_from_stream(self,clips,output_video_path:str,shorts_v1) -> tuple:
+        """
+        Cut the first pass (v1) shorts while the clips are still arriving,
+        clips can be a generator streaming them from the model.
+        Returns the clips and the paths of the cut shorts.
+        The single decode cutter needs every clip up front, so it waits for all of them.
+        """
+
+        if not settings.SHORTS_V1_STREAM_COPY:
+            video_timestamps = list(clips)
+            return video_timestamps,self.generate_shorts_single_decode(video_timestamps,output_video_path,shorts_v1)
 
-        return audio_split_timestamps
-    
-    
-    def generate_shorts(self,video_timestamps:list,output_video_path:str,shorts_v1,shorts_v2,final_shorts=False):
         count = 1
+        video_timestamps = []
         shorts_links = []
 
-        for index,item in enumerate(video_timestamps):
+        duration = ffmpeg_parse_infos(output_video_path)["duration"]
+        extension = os.path.splitext(output_video_path)[1] or ".mp4"
 
-            if final_shorts:
-                video = VideoFileClip(output_video_path[index])
-                shorts_saved = os.path.join(shorts_v2,f"short_v2_{count}.mp4")
-            else:
-                video = VideoFileClip(output_video_path)
-                shorts_saved = os.path.join(shorts_v1,f"short_v1_{count}.mp4")
+        for item in clips:
 
-            start_time = item["start"] 
-            end_time = item["end"] 
+            video_timestamps.append(item)
 
-            # Validate timestamps
-            if start_time < 0:
-                logger.warning(f"Invalid start_time {start_time} for short {count}, skipping")
-                continue
-                
-            if end_time <= start_time:
-                logger.warning(f"Invalid end_time {end_time} <= start_time {start_time} for short {count}, skipping")
+            shorts_saved = os.path.join(shorts_v1,f"short_v1_{count}{extension}")
+
+            start_time = item["start"]
+            end_time = self.validate_timestamps(item["start"],item["end"],duration,count)
+
+            if end_time is None:
                 continue
-                
-            if start_time >= video.duration:
-                logger.warning(f"start_time {start_time} >= video duration {video.duration} for short {count}, skipping")
+
+            try:
+                cut_start,cut_end = self.stream_copy_cut(output_video_path,start_time,end_time,duration,shorts_saved)
+            except subprocess.CalledProcessError as e:
+                logger.error(f"Error cutting video for short {count}: {e.stderr}")
                 continue
 
-            if end_time > video.duration:
-                end_time = video.duration
-                
-            # Ensure minimum duration
-            if end_time - start_time < 0.5:
-                logger.warning(f"Clip duration too short ({end_time - start_time}s) for short {count}, skipping")
+            item["source_start"] = cut_start
+            item["source_end"] = cut_end
+
+            logger.info(f"\nShort saved at path: {shorts_saved} (cut {cut_start:.2f}s - {cut_end:.2f}s)")
+
+            shorts_links.append(shorts_saved)
+
+            count += 1
+
+        return video_timestamps,shorts_links
+
+    def generate_shorts_single_decode(self,video_timestamps:list,output_video_path:str,shorts_v1):
+        """
+        Re-encode the first pass (v1) shorts from a single VideoFileClip.
+        The source is opened and probed once and the segments are rendered
+        in start order, so the shared reader only ever seeks forward.
+        """
+
+        shorts_links = {}
+        segments = []
+        count = 1
+
+        video = VideoFileClip(output_video_path)
+
+        for item in video_timestamps:
+            end_time = self.validate_timestamps(item["start"],item["end"],video.duration,count)
+
+            if end_time is None:
                 continue
 
+            segments.append((count,item,item["start"],end_time))
+            count += 1
+
+        for count,item,start_time,end_time in sorted(segments,key=lambda segment: segment[2]):
+
+            shorts_saved = os.path.join(shorts_v1,f"short_v1_{count}.mp4")
+
+            # Subclips share the reader of the source clip, so they are not closed here
             cropped_video = video.subclipped(start_time, end_time)
-            
-            # Validate cropped video
+
             if cropped_video.duration is None or cropped_video.duration <= 0:
                 logger.warning(f"Invalid cropped video duration for short {count}, skipping")
-                cropped_video.close()
-                video.close()
                 continue
-            if final_shorts:
-                if cropped_video.duration is None:
-                    logger.info("\nWarning: Duration not available")
-                else:
-                    logger.info(f"\nVideo duration: {cropped_video.duration} seconds")
-
-                fade_duration = 2
-                
-                video_with_fades = cropped_video.with_effects([
-                    FadeIn(fade_duration),
-                    FadeOut(fade_duration)
-                ])
 
+            # Validate audio before writing
+            try:
                 if cropped_video.audio is not None:
-                    audio = cropped_video.audio
-
-                    start_segment = audio.subclipped(0, fade_duration).with_effects([
-                            MultiplyVolume(0.7),
-                            AudioFadeIn(fade_duration)
-                        ])
-                    if cropped_video.duration > 2 * fade_duration:
-                        middle_segment = audio.subclipped(fade_duration, cropped_video.duration - fade_duration)
-                    else:
-                        middle_segment = None
-                    
-                    end_segment = audio.subclipped(cropped_video.duration - fade_duration, cropped_video.duration).with_effects([
-                            AudioFadeOut(fade_duration),
-                            MultiplyVolume(0.6)
-                        ])
-            
-                    if middle_segment is not None:
-                        from moviepy import concatenate_audioclips
-                        final_audio = concatenate_audioclips([start_segment, middle_segment, end_segment])
-                    else:
-                        final_audio = audio.with_effects([
-                            AudioFadeIn(fade_duration/2),
-                            AudioFadeOut(fade_duration/2),
-                            MultiplyVolume(0.5)
-                        ])
-
-                    final_clip = video_with_fades.with_audio(final_audio)
-                else:
-                    logger.info("\nWarning: No audio track found in the video")
-                    final_clip = video_with_fades
-
-                # Validate before writing final clip
-                try:
-                    if final_clip.audio is not None:
-                        audio_duration = final_clip.audio.duration
-                        if audio_duration is None or audio_duration <= 0:
-                            logger.warning(f"Invalid audio duration for final short {count}, writing without audio")
-                            final_clip = final_clip.without_audio()
-                    
-                    final_clip.write_videofile(shorts_saved,codec="libx264",audio_codec="aac",temp_audiofile_path=shorts_v2,remove_temp=True)
-                except Exception as e:
-                    logger.error(f"Error writing final video for short {count}: {e}")
-                    if final_shorts:
-                        final_clip.close()
-                        video_with_fades.close()
-                    cropped_video.close()
-                    video.close()
-                    continue
-            else:
-                # Validate audio before writing
+                    # Check if audio duration is valid
+                    audio_duration = cropped_video.audio.duration
+                    if audio_duration is None or audio_duration <= 0:
+                        logger.warning(f"Invalid audio duration for short {count}, writing without audio")
+                        cropped_video = cropped_video.without_audio()
+
+                cropped_video.write_videofile(shorts_saved,codec="libx264",audio_codec="aac",temp_audiofile_path=shorts_v1,remove_temp=True)
+            except Exception as e:
+                logger.error(f"Error writing video for short {count}: {e}")
+                continue
+
+            logger.info(f"\nShort saved at path: {shorts_saved}")
+
+            item["source_start"] = start_time
+            item["source_end"] = end_time
+
+            shorts_links[count] = shorts_saved
+
+        video.close()
+
+        return [shorts_links[count] for count in sorted(shorts_links)]
+
+
+    def generate_shorts(self,video_timestamps:list,output_video_path:str,shorts_v1,shorts_v2,final_shorts=False):
+
+        if not final_shorts:
+            if settings.SHORTS_V1_STREAM_COPY:
+                return self.generate_shorts_stream_copy(video_timestamps,output_video_path,shorts_v1)
+            return self.generate_shorts_single_decode(video_timestamps,output_video_path,shorts_v1)
+
+        jobs = [
+            (output_video_path[index],item["start"],item["end"],os.path.join(shorts_v2,f"short_v2_{index + 1}.mp4"),shorts_v2,index + 1)
+            for index,item in enumerate(video_timestamps)
+        ]
+
+        if not jobs:
+            return []
+
+        cpus = available_cpus()
+        workers = settings.SHORTS_RENDER_WORKERS or max(1,min(cpus,available_memory_mb() // settings.SHORTS_RENDER_WORKER_MEMORY_MB))
+        workers = max(1,min(workers,len(jobs)))
+        threads = max(1,cpus // workers)
+        logger.info(f"\nRendering {len(jobs)} final shorts with {workers} workers, {threads} x264 threads each")
+        # Celery prefork workers are daemonic and cannot start child processes
+        if multiprocessing.current_process().daemon:
+            logger.warning("Running inside a daemonic process, rendering final shorts in a thread pool")
+            executor = ThreadPoolExecutor(max_workers=workers)
+        else:
+            # Forking a process that already runs threads (loguru, boto3, the Modal runtime) can deadlock
+            executor = ProcessPoolExecutor(max_workers=workers,mp_context=multiprocessing.get_context("spawn"))
+        results = [None] * len(jobs)
+        retry = []
+        with executor:
+            futures = {executor.submit(render_final_short,*job,threads): index for index,job in enumerate(jobs)}
+            for future in as_completed(futures):
+                index = futures[future]
                 try:
-                    if cropped_video.audio is not None:
-                        # Check if audio duration is valid
-                        audio_duration = cropped_video.audio.duration
-                        if audio_duration is None or audio_duration <= 0:
-                            logger.warning(f"Invalid audio duration for short {count}, writing without audio")
-                            cropped_video = cropped_video.without_audio()
-                    
-                    cropped_video.write_videofile(shorts_saved,codec="libx264",audio_codec="aac",temp_audiofile_path=shorts_v1,remove_temp=True)
+                    results[index] = future.result()
+                except BrokenProcessPool:
+                    retry.append(index)
                 except Exception as e:
-                    logger.error(f"Error writing video for short {count}: {e}")
-                    cropped_video.close()
-                    video.close()
-                    continue
+                    logger.error(f"Error writing final video for short {index + 1}: {e}")
+        # A crashed worker breaks the whole pool, retry each unfinished short once in its own process
+        if retry:
+            logger.warning(f"Render pool crashed, retrying {len(retry)} shorts in isolated processes")
+            with ThreadPoolExecutor(max_workers=workers) as isolated:
+                futures = {isolated.submit(render_isolated,jobs[index],threads): index for index in retry}
+                for future in as_completed(futures):
+                    index = futures[future]
+                    try:
+                        results[index] = future.result()
+                    except Exception as e:
+                        logger.error(f"Error writing final video for short {index + 1} in an isolated process: {e!r}")
+        return [path for path in results if path is not None]
 
-            logger.info(f"\nShort saved at path: {shorts_saved}")
 
-            shorts_links.append(shorts_saved)
+def available_cpus() -> int:
+    """
+    CPUs this process may use, from its affinity mask and the cgroup quota (containers see the host's cores in os.cpu_count)
+    """
 
-            # Close all video clips after processing to free memory
-            if final_shorts:
-                final_clip.close()
-                video_with_fades.close()
-            cropped_video.close()
-            video.close()
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os,"sched_getaffinity") else os.cpu_count() or 1
 
-            count += 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as file:
+            quota,period = file.read().split()
+        if quota != "max":
+            cpus = min(cpus,max(1,int(quota) // int(period)))
+    except (OSError,ValueError):
+        pass
+
+    return cpus
+
+
+def available_memory_mb() -> int:
+    """
+    Memory this process may use in MB, the cgroup limit when there is one, otherwise the physical memory
+    """
+
+    memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+    try:
+        with open("/sys/fs/cgroup/memory.max") as file:
+            limit = file.read().strip()
+        if limit != "max":
+            memory = min(memory,int(limit))
+    except (OSError,ValueError):
+        pass
+
+    return memory // (1024 * 1024)
+
+
+def render_isolated(job,threads):
+    """
+    Render a final short in a process of its own, so a crash only takes down this short
+    """
 
-        return shorts_links
+    with ProcessPoolExecutor(max_workers=1,mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(render_final_short,*job,threads).result()
 
 
+def render_final_short(source_path,start_time,end_time,shorts_saved,temp_path,count,threads):
+    """
+    Render a single final (v2) short with fades and audio ramps.
+    Runs in a worker process, returns the saved path or None if the short is skipped.
+    """
 
+    video = VideoFileClip(source_path)
 
+    # Validate timestamps
+    end_time = VideoProcessor.validate_timestamps(start_time,end_time,video.duration,count)
 
+    if end_time is None:
+        video.close()
+        return None
 
+    cropped_video = video.subclipped(start_time, end_time)
+    
+    # Validate cropped video
+    if cropped_video.duration is None or cropped_video.duration <= 0:
+        logger.warning(f"Invalid cropped video duration for short {count}, skipping")
+        cropped_video.close()
+        video.close()
+        return None
+
+    logger.info(f"\nVideo duration: {cropped_video.duration} seconds")
+
+    fade_duration = 2
+    
+    video_with_fades = cropped_video.with_effects([
+        FadeIn(fade_duration),
+        FadeOut(fade_duration)
+    ])
+
+    if cropped_video.audio is not None:
+        audio = cropped_video.audio
+
+        start_segment = audio.subclipped(0, fade_duration).with_effects([
+                MultiplyVolume(0.7),
+                AudioFadeIn(fade_duration)
+            ])
+        if cropped_video.duration > 2 * fade_duration:
+            middle_segment = audio.subclipped(fade_duration, cropped_video.duration - fade_duration)
+        else:
+            middle_segment = None
+        
+        end_segment = audio.subclipped(cropped_video.duration - fade_duration, cropped_video.duration).with_effects([
+                AudioFadeOut(fade_duration),
+                MultiplyVolume(0.6)
+            ])
+
+        if middle_segment is not None:
+            final_audio = concatenate_audioclips([start_segment, middle_segment, end_segment])
+        else:
+            final_audio = audio.with_effects([
+                AudioFadeIn(fade_duration/2),
+                AudioFadeOut(fade_duration/2),
+                MultiplyVolume(0.5)
+            ])
+
+        final_clip = video_with_fades.with_audio(final_audio)
+    else:
+        logger.info("\nWarning: No audio track found in the video")
+        final_clip = video_with_fades
+
+    # Validate before writing final clip
+    try:
+        if final_clip.audio is not None:
+            audio_duration = final_clip.audio.duration
+            if audio_duration is None or audio_duration <= 0:
+                logger.warning(f"Invalid audio duration for final short {count}, writing without audio")
+                final_clip = final_clip.without_audio()
+        
+        final_clip.write_videofile(shorts_saved,codec="libx264",audio_codec="aac",threads=threads,temp_audiofile_path=temp_path,remove_temp=True,logger=None)
 
+        logger.info(f"\nShort saved at path: {shorts_saved}")
+    finally:
+        # Close all video clips after processing to free memory
+        final_clip.close()
+        video_with_fades.close()
+        cropped_video.close()
+        video.close()
 
+    return shorts_saved
@@ -0,0 +1,158 @@
+import math
+import re
+
+import numpy as np
+from loguru import logger
+from scipy.io import wavfile
+
+from config import get_settings
+from shorts_generator.audio_utils import energy_envelope
+from shorts_generator.transcript import TranscriptTimeline
+
+
+logger = logger.bind(name="WindowRanker")
+settings = get_settings()
+
+LIST_MARKERS = re.compile(
+    r"\b(first(ly)?|second(ly)?|third(ly)?|finally|step (one|two|three|\d+)|tip (one|two|three|\d+)|number (one|two|three|\d+)|\d+\.)\s",
+    re.I,
+)
+INTRO_PHRASES = re.compile(
+    r"\b(welcome (back )?to|my name is|in this video|in today's video|before we (start|begin|get started)|"
+    r"subscribe|sponsor(ed)?|link in the description|let me introduce|a little bit about (me|myself)|thanks for watching)\b",
+    re.I,
+)
+
+# Weight of each feature column in the window score (speech rate, energy variance,
+# questions, list markers, intro phrases), intro phrases count against a window
+FEATURE_WEIGHTS = np.array([1.0,1.0,0.8,0.8,-2.0])
+# Frames of the energy envelope, coarse enough to keep the envelope of hours of audio small
+ENERGY_FRAME_MS = 50
+# Seconds of audio read at a time while building the envelope
+ENERGY_BLOCK_SECONDS = 300
+
+
+class WindowRanker:
+    """
+    Scores fixed transcript windows with cheap local features so only the
+    promising parts of a long video are sent to the topic prompt.
+    Per window: speech rate (words per second), variance of the log energy of
+    the master audio, question and list markers, and intro phrases. Features are
+    standardized across the windows and weighted, the top windows are kept together
+    with their neighbours as context, within a budget of SHORTS_PREFILTER_KEEP of the windows.
+    """
+
+    def __init__(self,audio_path:str=None):
+        self.rate = None
+        self.data = None
+
+        if audio_path is not None:
+            self.rate,self.data = wavfile.read(audio_path,mmap=True)
+
+    def log_energy(self) -> np.ndarray:
+        """
+        Return the log energy envelope of the master audio in ENERGY_FRAME_MS frames
+        """
+
+        block = int(self.rate * ENERGY_BLOCK_SECONDS)
+        envelopes = [
+            energy_envelope(self.data[offset:offset + block],self.rate,ENERGY_FRAME_MS)
+            for offset in range(0,len(self.data),block)
+        ]
+
+        return np.log1p(np.concatenate(envelopes)) if envelopes else np.zeros(0)
+
+    def energy_variance(self,starts:np.ndarray,ends:np.ndarray) -> np.ndarray:
+        """
+        Return the variance of the log energy in every window, from prefix sums of the envelope
+        """
+
+        if self.data is None:
+            return np.zeros(len(starts))
+
+        energy = self.log_energy()
+        sums = np.concatenate(([0.0],np.cumsum(energy)))
+        squares = np.concatenate(([0.0],np.cumsum(energy ** 2)))
+
+        low = np.clip((starts * 1000 / ENERGY_FRAME_MS).astype(int),0,len(energy))
+        high = np.clip((ends * 1000 / ENERGY_FRAME_MS).astype(int),0,len(energy))
+        frames = np.maximum(high - low,1)
+
+        mean = (sums[high] - sums[low]) / frames
+        return np.maximum((squares[high] - squares[low]) / frames - mean ** 2,0.0)
+
+    def features(self,timeline:TranscriptTimeline,windows:list) -> np.ndarray:
+        """
+        Return one row of features per (start, end) window
+        """
+
+        starts = np.array([start for start,_ in windows],dtype=float)
+        ends = np.array([end for _,end in windows],dtype=float)
+
+        word_starts = np.asarray(timeline.word_starts,dtype=float)
+        words = np.searchsorted(word_starts,ends) - np.searchsorted(word_starts,starts)
+
+        # Text markers are counted per segment, then summed per window with prefix sums
+        texts = [segment["text"] for segment in timeline.segments]
+        markers = np.array([
+            (text.count("?"),len(LIST_MARKERS.findall(text)),len(INTRO_PHRASES.findall(text)))
+            for text in texts
+        ],dtype=float).reshape(len(texts),3)
+        totals = np.vstack((np.zeros(3),np.cumsum(markers,axis=0)))
+
+        segment_starts = np.asarray(timeline.segment_starts,dtype=float)
+        counts = totals[np.searchsorted(segment_starts,ends)] - totals[np.searchsorted(segment_starts,starts)]
+
+        return np.column_stack((
+            words / np.maximum(ends - starts,1e-6),
+            self.energy_variance(starts,ends),
+            counts,
+        ))
+
+    def scores(self,features:np.ndarray) -> np.ndarray:
+        spread = features.std(axis=0)
+        standardized = (features - features.mean(axis=0)) / np.where(spread > 0,spread,1.0)
+
+        # A rare marker in one window should not outweigh every other feature
+        return np.clip(standardized,-3,3) @ FEATURE_WEIGHTS
+
+    def select(self,timeline:TranscriptTimeline) -> list:
+        """
+        Return the merged (start, end) ranges of the kept windows and their context
+        """
+
+        windows = timeline.windows(settings.SHORTS_PREFILTER_WINDOW,0)
+        scores = self.scores(self.features(timeline,windows))
+
+        # The context windows count against the budget, so at most KEEP of the video is kept
+        budget = max(1,math.floor(len(windows) * settings.SHORTS_PREFILTER_KEEP))
+        context = settings.SHORTS_PREFILTER_CONTEXT
+        keep = np.zeros(len(windows),dtype=bool)
+        kept = 0
+
+        for index in np.argsort(-scores,kind="stable"):
+            if kept >= budget:
+                break
+
+            cluster = keep[max(0,index - context):index + context + 1]
+            added = int(np.count_nonzero(~cluster))
+
+            # A window whose context no longer fits is kept alone
+            if kept + added <= budget:
+                cluster[:] = True
+                kept += added
+            elif not keep[index]:
+                keep[index] = True
+                kept += 1
+
+        ranges = []
+        for index in np.flatnonzero(keep):
+            start,end = windows[index]
+            if ranges and ranges[-1][1] >= start:
+                ranges[-1] = (ranges[-1][0],end)
+            else:
+                ranges.append((start,end))
+
+        logger.info(f"\nPre-filter kept {kept} of {len(windows)} transcript windows ({kept * settings.SHORTS_PREFILTER_WINDOW} of {timeline.duration:.0f} seconds) in {len(ranges)} ranges")
+
+        return ranges
@@ -2,15 +2,16 @@ import os
 import shutil
 import requests
 from celery import Celery
-from concurrent.futures import ThreadPoolExecutor,as_completed
 from datetime import datetime
 
 from loguru import logger
 
 from shorts_generator.video_processor import VideoProcessor
 from shorts_generator.audio_trancriber import AudioTranscriber
+from shorts_generator.transcription_engine import TranscriptionEngine
 from shorts_generator.shorts_agent import ShortsAgent
 from shorts_generator.utils import upload_to_s3
+from shorts_generator.transcript import TranscriptTimeline,short_transcriptions_from_timeline
 
 from mail_sender import send_email
 
@@ -71,75 +72,56 @@ def send_webhook_notification(user_id, task_id, shorts_data, user_email, video_u
 @celery.task(bind=True)
 def get_shorts_from_video(self,user_id,user_email,video_url,shorts_time):
     transcriptions = []
-    short_transcriptions = []
-    shorts_v1_audio_path = []
-    final_timestamps = []
     task_id = self.request.id
 
     
     video_path = os.path.join(base_path,user_id,"video")
     audio_path = os.path.join(base_path,user_id,"audio")
     split_audio_path = os.path.join(base_path,user_id,"chunks")
-    shorts_audio_path = os.path.join(base_path,user_id,"shorts_audio")
     shorts_v1 = os.path.join(base_path,user_id,"shorts_v1")
     shorts_v2 = os.path.join(base_path,user_id,"shorts_v2")
 
     os.makedirs(video_path, exist_ok=True)
     os.makedirs(audio_path, exist_ok=True)
     os.makedirs(split_audio_path, exist_ok=True)
-    os.makedirs(shorts_audio_path,exist_ok=True)
     os.makedirs(shorts_v1,exist_ok=True)
     os.makedirs(shorts_v2,exist_ok=True)
 
     processor = VideoProcessor(video_url=video_url,video_path=video_path,audio_path=audio_path,split_audio_path=split_audio_path)
 
-    output_video_path = processor.download_video()
-    output_audio_path = processor.extarct_audio_from_video(output_video_path)
-    audio_split_timestamps = processor.split_audio_in_chunks(output_audio_path)
+    output_video_path,output_audio_path = processor.ingest_video()
 
     transcriber = AudioTranscriber()
+    engine = TranscriptionEngine(transcriber)
+    audio_split_timestamps = []
 
-    paths = [
-        os.path.join(split_audio_path, f"split_audio{i + 1}.wav")
-        for i in range(len(audio_split_timestamps))
-    ]
+    def audio_chunks():
+        # Each chunk is submitted for transcription as soon as it is encoded
+        for audio_dict,chunk in processor.iter_audio_chunks(output_audio_path,engine.limit):
+            audio_split_timestamps.append(audio_dict)
+            yield audio_dict["id"],chunk
 
-    with ThreadPoolExecutor(max_workers=8) as executor:
-            futures = {executor.submit(transcriber.transcribe_file, path,i+1): path for i,path in enumerate(paths)}
-            for future in as_completed(futures):
-                try:
-                    transcriptions.append(future.result())
-                except Exception as e:
-                    transcriptions.append({"error": str(e), "path": futures[future]})
+    transcriptions = engine.transcribe_chunks(audio_chunks())
 
+    timeline = TranscriptTimeline.from_transcriptions(transcriptions,audio_split_timestamps)
 
-    transcriptions.sort(key=lambda x: x["id"])
+    agent = ShortsAgent(timeline,output_audio_path)
 
-    agent = ShortsAgent(transcriptions,audio_split_timestamps)
+    # Each short is cut as soon as the model has streamed it
+    video_detailed_timestamps,shorts_path = processor.generate_shorts_from_stream(agent.iter_video_timestamps(shorts_time),output_video_path,shorts_v1)
 
-    video_detailed_timestamps = agent.video_timestamps(shorts_time)
+    # Word timestamps of the shorts are sliced from the first pass, only shorts
+    # overlapping a failed chunk are transcribed again from the master wav
+    short_transcriptions = short_transcriptions_from_timeline(timeline,video_detailed_timestamps)
+    retry = [short["id"] for short in short_transcriptions if "error" in short]
 
+    if retry:
+        shorts_v1_audio = processor.slice_shorts_audio(output_audio_path,video_detailed_timestamps)
 
-    shorts_path = processor.generate_shorts(video_detailed_timestamps,output_video_path,shorts_v1,shorts_v2)
-    for id,path in enumerate(shorts_path):
-        output_audio_path = processor.extarct_audio_from_video(path,shorts=True,id=id+1,output_shorts_path=shorts_audio_path)
-        shorts_v1_audio_path.append(output_audio_path)
+        for short_transcription in engine.transcribe_shorts((id,shorts_v1_audio[id-1]) for id in retry):
+            short_transcriptions[short_transcription["id"]-1] = short_transcription
 
-    
-
-    with ThreadPoolExecutor(max_workers=8) as executor:
-            futures = {executor.submit(transcriber.transcribe_short, path,i+1): path for i,path in enumerate(shorts_v1_audio_path)}
-            for future in as_completed(futures):
-                try:
-                    short_transcriptions.append(future.result())
-                except Exception as e:
-                    short_transcriptions.append({"error": str(e), "path": futures[future]})
-
-    short_transcriptions.sort(key=lambda x:x["id"])
-
-    for short_transcription in short_transcriptions:
-         timestamp = agent.enhance_video_timestamps(short_transcription)
-         final_timestamps.append(timestamp)
+    final_timestamps = agent.enhance_all(short_transcriptions,video_detailed_timestamps,output_audio_path)
 
     local_shorts_path = processor.generate_shorts(final_timestamps,shorts_path,shorts_v1,shorts_v2,final_shorts=True)
 
@@ -0,0 +1,59 @@
+"""
+Throughput and tail latency of the TranscriptionEngine against the local fake Groq server.
+
+    python tests/benchmark_transcription.py --chunks 200 --capacity 8 --latency 0.5 --jitter 0.5
+"""
+
+import argparse
+import time
+from io import BytesIO
+
+# Puts src on the path and fills the required settings
+import conftest  # noqa: F401
+from fake_groq import FakeGroqServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks",type=int,default=100)
+    parser.add_argument("--capacity",type=int,default=8,help="requests in flight before the server answers 429")
+    parser.add_argument("--latency",type=float,default=0.3)
+    parser.add_argument("--jitter",type=float,default=0.3)
+    parser.add_argument("--retry-after",type=float,default=0.5)
+    parser.add_argument("--initial",type=int,default=4,help="initial concurrency of the engine")
+    args = parser.parse_args()
+
+    from config import get_settings
+
+    settings = get_settings()
+    settings.TRANSCRIPTION_BACKEND = "groq"
+    settings.TRANSCRIPTION_FALLBACK_BACKEND = "none"
+    settings.TRANSCRIPTION_CACHE_BACKEND = "none"
+    settings.TRANSCRIBE_INITIAL_CONCURRENCY = args.initial
+
+    from shorts_generator.audio_trancriber import AudioTranscriber
+    from shorts_generator.transcription_engine import TranscriptionEngine
+
+    with FakeGroqServer(args.capacity,args.latency,args.jitter,args.retry_after) as server:
+        settings.GROQ_BASE_URL = server.url
+        engine = TranscriptionEngine(AudioTranscriber())
+
+        items = []
+        for id in range(1,args.chunks + 1):
+            audio = BytesIO(f"audio {id}".encode())
+            audio.name = f"chunk_{id}.flac"
+            items.append((id,audio))
+
+        started = time.monotonic()
+        results = engine.transcribe_chunks(items)
+        elapsed = time.monotonic() - started
+
+    failed = sum("error" in result for result in results)
+
+    print(f"{args.chunks} chunks in {elapsed:.2f}s, {args.chunks / elapsed:.1f} chunks/s, {failed} failed")
+    print(f"server: {server.requests} requests, {server.throttled} throttled, peak {server.peak} in flight")
+    print(f"engine: final concurrency {engine.limit}, ideal throughput {args.capacity / (args.latency + args.jitter / 2):.1f} chunks/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import os
+import sys
+import tempfile
+
+
+# The modules import flat from src and read the settings at import time
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),"src"))
+
+for name,value in {
+    "GEMINI_API_KEY": "test",
+    "GROQ_API_KEY": "test",
+    "BUCKET_NAME": "test-bucket",
+    "AWS_REGION": "us-east-1",
+    "AWS_ACCESS_KEY": "test",
+    "AWS_SECRET_KEY": "test",
+    "SUPABASE_ANON_KEY": "test",
+    "SENDER_EMAIL_ADDRESS": "test@example.com",
+    "APP_PASSWORD": "test",
+    "SENDER_HOST": "localhost",
+    "SENDER_PORT": "25",
+    "CACHE_DIR": tempfile.mkdtemp(prefix="shorts-test-cache-"),
+}.items():
+    os.environ.setdefault(name,value)
@@ -0,0 +1,93 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler,ThreadingHTTPServer
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    def log_message(self,*args):
+        pass
+
+    def read_body(self):
+        length = self.headers.get("Content-Length")
+        if length is not None:
+            self.rfile.read(int(length))
+            return
+
+        # Chunked upload of a streamed file
+        while True:
+            size = int(self.rfile.readline().strip(),16)
+            self.rfile.read(size + 2)
+            if size == 0:
+                break
+
+    def respond(self,status:int,body:dict,headers:dict=None):
+        data = json.dumps(body).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type","application/json")
+        self.send_header("Content-Length",str(len(data)))
+        for name,value in (headers or {}).items():
+            self.send_header(name,value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server.fake
+        self.read_body()
+
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.peak = max(server.peak,server.in_flight)
+            throttled = server.in_flight > server.capacity
+
+        try:
+            if throttled:
+                with server.lock:
+                    server.throttled += 1
+                self.respond(429,{"error": {"message": "Rate limit reached","type": "requests","code": "rate_limit_exceeded"}},{"retry-after": str(server.retry_after)})
+                return
+
+            time.sleep(server.latency + random.uniform(0,server.jitter))
+            self.respond(200,{
+                "text": " hello world.",
+                "segments": [{"id": 0,"start": 0.0,"end": 1.0,"text": " hello world."}],
+                "words": [{"start": 0.0,"end": 0.4,"word": "hello"},{"start": 0.5,"end": 1.0,"word": "world"}],
+            })
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+
+class FakeGroqServer:
+    """
+    Local stand-in for the Groq transcription api.
+    Requests beyond capacity in flight get a 429 with a retry-after header,
+    the others answer a fixed verbose_json transcription after latency (plus up to jitter) seconds.
+    Used as a context manager, url is the base_url for the Groq client.
+    """
+
+    def __init__(self,capacity:int=4,latency:float=0.05,jitter:float=0.0,retry_after:float=0.05):
+        self.capacity = capacity
+        self.latency = latency
+        self.jitter = jitter
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.peak = 0
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1",0),FakeGroqHandler)
+        self.httpd.fake = self
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever,daemon=True).start()
+        return self
+
+    def __exit__(self,*exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
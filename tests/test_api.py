@@ -0,0 +1,20 @@
+import pytest
+from pydantic import ValidationError
+
+import api
+from model import QueryRequest
+
+
+def test_api_routes_load():
+    paths = {route.path for route in api.app.routes}
+
+    assert {"/uploadfile/","/shorts","/get-shorts/{user_id}/{task_id}"} <= paths
+
+
+def test_query_request_validates_the_email():
+    request = QueryRequest(user_id="user",user_email="user@example.com",video_url="https://example.com/video.mp4",shorts_time=30)
+
+    assert request.user_email == "user@example.com"
+
+    with pytest.raises(ValidationError):
+        QueryRequest(user_id="user",user_email="not an email",video_url="https://example.com/video.mp4",shorts_time=30)
@@ -0,0 +1,42 @@
+import os
+import threading
+from io import BytesIO
+
+import numpy as np
+import pytest
+
+from shorts_generator.audio_utils import audio_digest,encode_audio
+from shorts_generator.cache import DiskCache
+
+
+def test_concurrent_sets_of_one_key(tmp_path):
+    cache = DiskCache(str(tmp_path),max_bytes=10 * 1024 * 1024)
+    errors = []
+
+    def writer(index):
+        try:
+            for _ in range(50):
+                cache.set("key",{"writer": index,"text": "x" * 1000})
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer,args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert cache.get("key")["text"] == "x" * 1000
+    assert os.listdir(tmp_path) == ["key.json"]
+
+
+@pytest.mark.parametrize("audio_format",["flac","opus"])
+def test_same_samples_encode_to_the_same_digest(audio_format):
+    rate = 16000
+    data = (np.sin(np.arange(rate * 2) * 0.05) * 8000).astype(np.int16)
+
+    first = encode_audio(data,rate,audio_format)
+    second = encode_audio(data,rate,audio_format)
+
+    assert audio_digest(BytesIO(first)) == audio_digest(BytesIO(second))
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler,ThreadingHTTPServer
+
+import pytest
+
+from shorts_generator import downloader
+from shorts_generator.downloader import DownloadError,VideoDownloader
+
+
+PART_SIZE = 1024
+DATA = os.urandom(10 * PART_SIZE + 100)
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """
+    Serves DATA with optional Range support, configured through server.options
+    """
+
+    def log_message(self,*args):
+        pass
+
+    def do_HEAD(self):
+        options = self.server.options
+
+        self.send_response(200)
+        self.send_header("Content-Length",str(options["head_size"] or len(DATA)))
+        self.send_header("ETag",'"v1"')
+        if options["ranges"]:
+            self.send_header("Accept-Ranges","bytes")
+        self.end_headers()
+
+    def do_GET(self):
+        options = self.server.options
+        match = re.fullmatch(r"bytes=(\d+)-(\d+)",self.headers.get("Range",""))
+
+        with self.server.lock:
+            self.server.requests.append((int(match.group(1)),int(match.group(2))) if match else None)
+
+        if match and not options["ignore_range"]:
+            start,end = int(match.group(1)),int(match.group(2))
+            if options["fail_from"] is not None and start >= options["fail_from"]:
+                self.send_error(500)
+                return
+            body = DATA[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range",f"bytes {start}-{start + len(body) - 1}/{len(DATA)}")
+        else:
+            body = DATA
+            self.send_response(200)
+
+        self.send_header("Content-Length",str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1",0),RangeHandler)
+    httpd.options = {"ranges": True,"ignore_range": False,"fail_from": None,"head_size": None}
+    httpd.requests = []
+    httpd.lock = threading.Lock()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/video.mp4"
+
+    thread = threading.Thread(target=httpd.serve_forever,daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def small_parts(monkeypatch):
+    monkeypatch.setattr(downloader.settings,"DOWNLOAD_PART_SIZE",PART_SIZE)
+    monkeypatch.setattr(downloader.settings,"DOWNLOAD_WORKERS",4)
+    monkeypatch.setattr(downloader.settings,"DOWNLOAD_RETRIES",0)
+    monkeypatch.setattr(downloader.time,"sleep",lambda seconds: None)
+
+
+def read(path):
+    with open(path,"rb") as file:
+        return file.read()
+
+
+def test_parallel_parts(server,tmp_path):
+    output = str(tmp_path / "video.mp4")
+    received = []
+
+    VideoDownloader(server.url,output).download(received.append)
+
+    assert read(output) == DATA
+    assert b"".join(received) == DATA
+    assert sorted(server.requests) == [(start,min(start + PART_SIZE,len(DATA)) - 1) for start in range(0,len(DATA),PART_SIZE)]
+    assert not os.path.exists(f"{output}.part")
+    assert not os.path.exists(f"{output}.part.json")
+
+
+def test_resume_after_killed_attempt(server,tmp_path,monkeypatch):
+    output = str(tmp_path / "video.mp4")
+    monkeypatch.setattr(downloader.settings,"DOWNLOAD_WORKERS",1)
+    server.options["fail_from"] = 5 * PART_SIZE
+
+    with pytest.raises(Exception):
+        VideoDownloader(server.url,output).download()
+
+    with open(f"{output}.part.json") as file:
+        assert json.load(file)["done"] == [0,1,2,3,4]
+
+    server.options["fail_from"] = None
+    server.requests.clear()
+
+    VideoDownloader(server.url,output).download()
+
+    assert read(output) == DATA
+    assert sorted(start // PART_SIZE for start,_ in server.requests) == [5,6,7,8,9,10]
+
+
+def test_server_without_ranges(server,tmp_path):
+    output = str(tmp_path / "video.mp4")
+    server.options["ranges"] = False
+
+    VideoDownloader(server.url,output).download()
+
+    assert read(output) == DATA
+    assert server.requests == [None]
+
+
+def test_server_ignoring_range(server,tmp_path):
+    output = str(tmp_path / "video.mp4")
+    server.options["ignore_range"] = True
+    received = []
+
+    VideoDownloader(server.url,output).download(received.append)
+
+    assert read(output) == DATA
+    assert b"".join(received) == DATA
+
+
+def test_size_mismatch(server,tmp_path):
+    output = str(tmp_path / "video.mp4")
+    server.options["ranges"] = False
+    server.options["head_size"] = len(DATA) + 10
+
+    with pytest.raises(DownloadError):
+        VideoDownloader(server.url,output).download()
+
+    assert not os.path.exists(output)
+    assert not os.path.exists(f"{output}.part")
+
+
+@pytest.mark.parametrize("encryption,checked",[(None,True),("AES256",True),("aws:kms",False),("SSE-C",False)])
+def test_md5_etag_only_without_kms_or_customer_keys(tmp_path,encryption,checked):
+    url = f"https://{downloader.settings.BUCKET_NAME}.s3.us-east-1.amazonaws.com/videos/video.mp4"
+    video = VideoDownloader(url,str(tmp_path / "video.mp4"))
+
+    with open(video.part_path,"wb") as file:
+        file.write(DATA)
+
+    remote = {"size": len(DATA),"etag": f'"{hashlib.md5(b"other").hexdigest()}"',"encryption": encryption}
+
+    if checked:
+        with pytest.raises(DownloadError):
+            video.verify(remote)
+    else:
+        video.verify(remote)
+
+    remote["etag"] = f'"{hashlib.md5(DATA).hexdigest()}"'
+    video.verify(remote)
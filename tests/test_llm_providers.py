@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from shorts_generator.llm_providers import FixtureProvider,LLMProvider,template_inputs
+from shorts_generator.prompt import SHORTS_TOPIC_PROMPT,SHORT_ENHANCEMENT_PROPMT,SHORTS_BATCH_ENHANCEMENT_PROMPT
+
+
+WORDS = [{"start": 0.5,"end": 0.9,"word": "hello"},{"start": 1.0,"end": 1.4,"word": "world"}]
+
+
+def test_llm_provider_is_abstract():
+    with pytest.raises(TypeError):
+        LLMProvider()
+
+
+def test_template_inputs_round_trip():
+    transcript = "[0.0-1.0] the 2. A target short duration in seconds provided by the user 45\n[1.0-2.0] end"
+
+    assert template_inputs(SHORTS_TOPIC_PROMPT,SHORTS_TOPIC_PROMPT.format(transcript,30)) == [transcript,"30"]
+    assert template_inputs(SHORT_ENHANCEMENT_PROPMT,SHORTS_TOPIC_PROMPT.format(transcript,30)) is None
+
+
+def test_fixture_routes_by_template_not_transcript_content():
+    # Transcript text that looks like the enhancement payloads
+    transcript = """[0.0-4.0] she said [{"id" and 'word' out loud
+[4.0-8.0] then carried on talking"""
+
+    clips = json.loads(FixtureProvider().generate("model",SHORTS_TOPIC_PROMPT.format(transcript,30)))
+
+    assert [(clip["start"],clip["end"]) for clip in clips] == [(0.0,8.0)]
+
+
+def test_fixture_enhancement_prompts():
+    provider = FixtureProvider()
+    short = {"id": 3,"text": "hello world","word_with_timestamps": WORDS}
+
+    clip = json.loads(provider.generate("model",SHORT_ENHANCEMENT_PROPMT.format(short)))
+    batch = json.loads(provider.generate("model",SHORTS_BATCH_ENHANCEMENT_PROMPT.format(json.dumps([short]))))
+
+    assert (clip["start"],clip["end"]) == (0.5,1.4)
+    assert [(item["id"],item["start"],item["end"]) for item in batch] == [(3,0.5,1.4)]
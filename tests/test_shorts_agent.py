@@ -0,0 +1,152 @@
+import json
+
+import pytest
+
+from shorts_generator import shorts_agent
+from shorts_generator.boundary_snapper import BoundarySnapper
+from shorts_generator.cache import get_cache
+from shorts_generator.clip import ShortClip
+from shorts_generator.llm_providers import FixtureProvider,fixture_clip
+from shorts_generator.prompt import SHORTS_TOPIC_PROMPT
+from shorts_generator.shorts_agent import ShortsAgent,key_config
+from shorts_generator.transcript import TranscriptTimeline,short_transcriptions_from_timeline
+
+
+settings = shorts_agent.settings
+
+SENTENCES = [
+    "We start with the basics today.",
+    "Here is why it works so well.",
+    "Most people skip this part.",
+    "Now the next idea builds on it.",
+]
+
+
+def make_timeline(segments:int=40) -> TranscriptTimeline:
+    """
+    Return a timeline of whisper style words without punctuation, the punctuation is in the segment text
+    """
+
+    timeline_segments = []
+    words = []
+    time = 0.0
+
+    for index in range(segments):
+        text = SENTENCES[index % len(SENTENCES)]
+        start = time
+        for word in text.split():
+            words.append({"start": round(time,3),"end": round(time + 0.3,3),"word": word.strip(".")})
+            time += 0.4
+        timeline_segments.append({"start": round(start,3),"end": round(time - 0.1,3),"text": text})
+        time += 0.6
+
+    return TranscriptTimeline(timeline_segments,words)
+
+
+class RecordingProvider(FixtureProvider):
+    """
+    Fixture provider answering the topic prompt with the given clips
+    """
+
+    def __init__(self,clips):
+        self.clips = clips
+        self.calls = 0
+
+    def generate(self,model,prompt,config=None):
+        self.calls += 1
+        return self.clips
+
+
+@pytest.fixture(autouse=True)
+def agent_settings(monkeypatch):
+    monkeypatch.setattr(settings,"SHORTS_LLM_PROVIDER","fixture")
+    monkeypatch.setattr(settings,"LLM_CACHE_BACKEND","none")
+    monkeypatch.setattr(settings,"LLM_CACHE_BYPASS",False)
+    monkeypatch.setattr(settings,"SHORTS_SELECTION_MODE","single")
+
+
+def cached_agent(tmp_path,monkeypatch,provider) -> ShortsAgent:
+    monkeypatch.setattr(settings,"CACHE_DIR",str(tmp_path))
+    agent = ShortsAgent(make_timeline())
+    agent.cache = get_cache("llm","disk",1)
+    agent.provider = provider
+    return agent
+
+
+@pytest.mark.parametrize("response",["[]",'[{"title": "missing every other field"}]'])
+def test_empty_selections_are_not_cached(tmp_path,monkeypatch,response):
+    provider = RecordingProvider(response)
+    agent = cached_agent(tmp_path,monkeypatch,provider)
+
+    assert agent.video_timestamps(30) == []
+    assert agent.video_timestamps(30) == []
+    assert provider.calls == 2
+
+    assert list(agent.iter_video_timestamps(30)) == []
+    assert list(agent.iter_video_timestamps(30)) == []
+    assert provider.calls == 4
+
+
+def test_selections_are_cached(tmp_path,monkeypatch):
+    provider = RecordingProvider(FixtureProvider().generate(settings.SHORTS_MODEL,SHORTS_TOPIC_PROMPT.format(make_timeline().to_compact(),30)))
+    agent = cached_agent(tmp_path,monkeypatch,provider)
+
+    first = agent.video_timestamps(30)
+    assert first and agent.video_timestamps(30) == first
+    assert provider.calls == 1
+
+
+def test_cache_key_follows_the_clip_schema():
+    config = {"response_mime_type": "application/json","response_schema": list[ShortClip]}
+
+    schema = key_config(config)["response_schema"]
+
+    assert schema["type"] == "array"
+    assert "confidence_score" in schema["$defs"]["ShortClip"]["properties"]
+    assert key_config(None) is None
+
+
+class FailingProvider(FixtureProvider):
+    def generate(self,model,prompt,config=None):
+        raise AssertionError("the model should not be asked")
+
+
+def test_shorts_are_trimmed_locally_from_unpunctuated_words(monkeypatch):
+    monkeypatch.setattr(settings,"SHORTS_LOCAL_SNAPPING",True)
+    timeline = make_timeline()
+    agent = ShortsAgent(timeline)
+    agent.provider = FailingProvider()
+
+    # First pass shorts padded by about 2.5 seconds around whole sentences
+    segments = timeline.segments
+    video_timestamps = []
+    for first,last in ((2,6),(10,15),(20,23)):
+        start,end = segments[first]["start"] - 2.5,segments[last]["end"] + 2.5
+        video_timestamps.append({"title": "Short","start": start,"end": end,"source_start": start - 1,"source_end": end + 1})
+
+    short_transcriptions = short_transcriptions_from_timeline(timeline,video_timestamps)
+    snapper = BoundarySnapper(timeline=timeline)
+
+    for item,short in zip(video_timestamps,short_transcriptions):
+        timestamp,confidence = snapper.snap(item,short)
+        assert confidence >= settings.SHORTS_SNAP_CONFIDENCE
+        assert all("." not in word["word"] for word in short["word_with_timestamps"])
+
+    final_timestamps = agent.enhance_all(short_transcriptions,video_timestamps)
+
+    for (first,last),item,timestamp in zip(((2,6),(10,15),(20,23)),video_timestamps,final_timestamps):
+        offset = item["source_start"]
+        assert timestamp["start"] <= segments[first]["start"] - offset <= timestamp["start"] + 0.4
+        assert timestamp["end"] - 0.4 <= segments[last]["end"] - offset <= timestamp["end"]
+
+
+def test_clips_spanning_left_out_speech_are_clamped_or_dropped(tmp_path,monkeypatch):
+    clips = [fixture_clip("inside",5.0,30.0,0),fixture_clip("over the edge",40.0,70.0,1),fixture_clip("across the gap",50.0,130.0,2)]
+    provider = RecordingProvider(json.dumps(clips))
+    agent = cached_agent(tmp_path,monkeypatch,provider)
+    agent.ranges = [(0.0,60.0),(120.0,180.0)]
+
+    expected = [(5.0,30.0),(40.0,60.0)]
+
+    assert [(clip["start"],clip["end"]) for clip in agent.video_timestamps(30)] == expected
+    assert [(clip["start"],clip["end"]) for clip in agent.iter_video_timestamps(30)] == expected
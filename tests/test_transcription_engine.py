@@ -0,0 +1,154 @@
+import asyncio
+from io import BytesIO
+from types import SimpleNamespace
+
+import pytest
+
+from fake_groq import FakeGroqServer
+from shorts_generator import transcription_engine
+from shorts_generator.audio_trancriber import AudioTranscriber
+from shorts_generator.transcription_backends import GroqBackend,TranscriptionBackend
+from shorts_generator.transcription_engine import AdaptiveLimiter,TranscriptionEngine,backoff_delay
+
+
+settings = transcription_engine.settings
+
+
+class EchoBackend(TranscriptionBackend):
+    name = "echo"
+    model = "echo"
+
+    def transcribe(self,audio,**params) -> dict:
+        return {"text": " echo","segments": [],"words": [{"start": 0.0,"end": 0.5,"word": "echo"}]}
+
+
+@pytest.fixture(autouse=True)
+def engine_settings(monkeypatch):
+    monkeypatch.setattr(settings,"TRANSCRIPTION_BACKEND","stub")
+    monkeypatch.setattr(settings,"TRANSCRIPTION_FALLBACK_BACKEND","none")
+    monkeypatch.setattr(settings,"TRANSCRIPTION_CACHE_BACKEND","none")
+    monkeypatch.setattr(settings,"TRANSCRIBE_BACKOFF_BASE",0.01)
+    monkeypatch.setattr(settings,"TRANSCRIBE_BACKOFF_MAX",0.05)
+    monkeypatch.setattr(settings,"TRANSCRIBE_MAX_RETRIES",20)
+    monkeypatch.setattr(settings,"TRANSCRIBE_TARGET_LATENCY",1.0)
+
+
+def make_engine(fallback:TranscriptionBackend=None) -> TranscriptionEngine:
+    """
+    Return an engine on the Groq backend at GROQ_BASE_URL
+    """
+
+    transcriber = AudioTranscriber()
+    transcriber.backend = GroqBackend()
+    transcriber.fallback = fallback
+
+    return TranscriptionEngine(transcriber)
+
+
+def audio_items(count:int) -> list:
+    items = []
+    for id in range(1,count + 1):
+        audio = BytesIO(f"audio {id}".encode())
+        audio.name = f"chunk_{id}.flac"
+        items.append((id,audio))
+    return items
+
+
+def test_limiter_grows_by_one_after_a_window_of_fast_responses():
+    async def scenario():
+        limiter = AdaptiveLimiter(2,1,8,target_latency=1.0)
+        for _ in range(2):
+            await limiter.acquire()
+        for _ in range(2):
+            await limiter.release(0.1)
+        return limiter.limit
+
+    assert asyncio.run(scenario()) == 3
+
+
+def test_limiter_halves_once_per_round_trip():
+    async def scenario():
+        limiter = AdaptiveLimiter(8,1,16,target_latency=1.0)
+        for _ in range(4):
+            await limiter.acquire()
+
+        # The four requests in flight hit the same congestion
+        for _ in range(4):
+            await limiter.release(0.5,throttled=True)
+        after_throttle = limiter.limit
+
+        # A later response slower than twice the target halves again
+        limiter.last_decrease -= 10
+        await limiter.acquire()
+        await limiter.release(2.5)
+        after_slow = limiter.limit
+
+        for _ in range(5):
+            limiter.last_decrease -= 10
+            await limiter.acquire()
+            await limiter.release(0.5,throttled=True)
+
+        return after_throttle,after_slow,limiter.limit
+
+    assert asyncio.run(scenario()) == (4,2,1)
+
+
+def test_backoff_honours_retry_after(monkeypatch):
+    monkeypatch.setattr(settings,"TRANSCRIBE_BACKOFF_BASE",1.0)
+    monkeypatch.setattr(settings,"TRANSCRIBE_BACKOFF_MAX",60.0)
+
+    throttled = SimpleNamespace(response=SimpleNamespace(headers={"retry-after": "7"}))
+    unreadable = SimpleNamespace(response=SimpleNamespace(headers={"retry-after": "soon"}))
+
+    assert all(backoff_delay(0,throttled) >= 7 for _ in range(20))
+    assert all(0 <= backoff_delay(2,unreadable) <= 4 for _ in range(20))
+    assert all(0 <= backoff_delay(10,ConnectionError()) <= 60 for _ in range(20))
+
+
+def test_engine_backs_off_on_rate_limits(monkeypatch):
+    delays = []
+
+    def recorded_delay(attempt,error):
+        delay = backoff_delay(attempt,error)
+        delays.append(delay)
+        return delay
+
+    monkeypatch.setattr(transcription_engine,"backoff_delay",recorded_delay)
+    monkeypatch.setattr(settings,"TRANSCRIBE_INITIAL_CONCURRENCY",8)
+
+    with FakeGroqServer(capacity=2,latency=0.05,retry_after=0.1) as server:
+        monkeypatch.setattr(settings,"GROQ_BASE_URL",server.url)
+        engine = make_engine()
+        results = engine.transcribe_chunks(audio_items(12))
+
+    assert [result["id"] for result in results] == list(range(1,13))
+    assert all("error" not in result for result in results)
+    assert results[0]["word_with_timestamps"][0]["word"] == "hello"
+
+    assert server.throttled > 0
+    assert len(delays) == server.throttled
+    assert all(delay >= 0.1 for delay in delays)
+    assert engine.limit < 8
+
+
+def test_throttled_requests_spill_over_to_the_fallback(monkeypatch):
+    with FakeGroqServer(capacity=0,retry_after=0.01) as server:
+        monkeypatch.setattr(settings,"GROQ_BASE_URL",server.url)
+        engine = make_engine(fallback=EchoBackend())
+        results = engine.transcribe_shorts(audio_items(5))
+
+    assert [result["id"] for result in results] == list(range(1,6))
+    assert all(result["text"] == " echo" for result in results)
+    assert server.throttled >= 5
+
+
+def test_engine_reports_audio_failing_every_retry(monkeypatch):
+    monkeypatch.setattr(settings,"TRANSCRIBE_MAX_RETRIES",2)
+
+    with FakeGroqServer(capacity=0,retry_after=0.01) as server:
+        monkeypatch.setattr(settings,"GROQ_BASE_URL",server.url)
+        results = make_engine().transcribe_chunks(audio_items(3))
+
+    assert [result["id"] for result in results] == [1,2,3]
+    assert all("error" in result for result in results)
+    assert server.requests == 9
@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+from shorts_generator import window_ranker
+from shorts_generator.transcript import TranscriptTimeline
+from shorts_generator.window_ranker import WindowRanker
+
+
+settings = window_ranker.settings
+
+SENTENCES = [
+    "We start with the basics today.",
+    "Why does this work so well?",
+    "First, set the camera up.",
+    "Welcome back to the channel.",
+    "Most people skip this part.",
+]
+
+
+def make_timeline(duration:float,seed:int=0) -> TranscriptTimeline:
+    """
+    Return a timeline of random sentences spoken at a random pace
+    """
+
+    generator = random.Random(seed)
+    segments = []
+    words = []
+    time = 0.0
+
+    while time < duration:
+        text = generator.choice(SENTENCES)
+        start = time
+        for word in text.split():
+            words.append({"start": round(time,3),"end": round(time + 0.3,3),"word": word})
+            time += generator.uniform(0.35,0.8)
+        segments.append({"start": round(start,3),"end": round(time,3),"text": text})
+        time += generator.uniform(0.2,3.0)
+
+    return TranscriptTimeline(segments,words)
+
+
+@pytest.mark.parametrize("keep,context",[(0.4,1),(0.25,2),(0.1,0)])
+def test_kept_share_stays_within_the_budget(monkeypatch,keep,context):
+    monkeypatch.setattr(settings,"SHORTS_PREFILTER_WINDOW",60)
+    monkeypatch.setattr(settings,"SHORTS_PREFILTER_KEEP",keep)
+    monkeypatch.setattr(settings,"SHORTS_PREFILTER_CONTEXT",context)
+
+    timeline = make_timeline(3 * 3600)
+    windows = timeline.windows(60,0)
+    ranges = WindowRanker().select(timeline)
+
+    kept = sum(end - start for start,end in ranges) / 60
+
+    assert len(windows) >= 180
+    assert kept <= len(windows) * keep
+    assert kept >= len(windows) * keep - 1
+    assert all(previous[1] < start for previous,(start,_) in zip(ranges,ranges[1:]))